@@ -1,54 +1,317 @@
+import itertools
+import json
 import threading
 import time
-import uuid
 from botasaurus.browser import Driver, Wait
 from config import logger, settings
+from health import BrowserWatchdog
+from limiter import page_limiter
+from metrics import metrics
+from proxy import proxy_manager
 from schemas import BrowserConfig, Element
 
 
 class ElementCache:
     def __init__(self):
-        self._cache = {}  # uuid -> {element, selector}
+        self._cache = {}  # id -> (element, selector)
         self._lock = threading.Lock()  # Thread-safe access to cache
+        self._ids = itertools.count(1)  # ids only need to be unique per cache
 
     def store(self, selector, element) -> str:
-        """Store element and return UUID"""
+        """Store element and return its cache id"""
         if element is None:
             # logger.error(f"Element is None for selector {selector}")
             return None
 
-        element_uuid = str(uuid.uuid4())
+        element_id = str(next(self._ids))
         with self._lock:
-            self._cache[element_uuid] = {"element": element, "selector": selector}
-        return element_uuid
+            self._cache[element_id] = (element, selector)
+        return element_id
 
-    def get(self, element_uuid: str):
+    def get(self, element_id: str):
         with self._lock:
-            data = self._cache.get(element_uuid)
-        return data["element"] if data else None
+            data = self._cache.get(element_id)
+        return data[0] if data else None
+
+
+def launch_driver(proxy_ip=None) -> Driver:
+    return Driver(
+        headless=not settings.LOCAL_DEV,
+        proxy=proxy_manager.url(proxy_ip) if proxy_ip else None,
+        arguments=[
+            "--no-sandbox",
+            "--disable-dev-shm-usage",
+            "--disable-gpu",
+            "--disable-software-rasterizer",
+            "--disable-extensions",
+            "--headless=new",
+            "--remote-debugging-port=9222",
+            "--window-size=1920,1080"
+        ] if not settings.LOCAL_DEV else []
+    )
+
+
+class PooledBrowser:
+    """A launched Chrome plus the bookkeeping the watchdog needs"""
+
+    def __init__(self, config: BrowserConfig, proxy_ip=None):
+        self.config = config
+        self.proxy_ip = proxy_ip
+        self.driver = launch_driver(proxy_ip)
+        self.pid = getattr(self.driver._browser, "_process_pid", None)
+        self.created_at = time.time()
+        self.last_used = self.created_at
+        self.jobs = 0
+        self.page_loads = 0
+        self.rss = 0
+        self.logged_in = False
+        self.flagged = None  # recycle reason noticed while the browser was busy
+
+    def to_dict(self) -> dict:
+        return {
+            "pid": self.pid,
+            "proxy": self.proxy_ip,
+            "age": round(time.time() - self.created_at, 1),
+            "jobs": self.jobs,
+            "page_loads": self.page_loads,
+            "rss_mb": round(self.rss / (1024 * 1024), 1),
+            "logged_in": self.logged_in,
+            "flagged": self.flagged,
+        }
+
+
+class BrowserPool:
+    """Keeps warm browsers between jobs and recycles unhealthy ones.
+
+    Health checks run on acquisition and in a background watchdog thread;
+    browsers are never closed while a job holds them.
+    """
+
+    def __init__(self, max_idle: int):
+        self.max_idle = max_idle
+        self.watchdog = BrowserWatchdog()
+        self._idle = []
+        self._busy = []
+        self._checking = []  # idle browsers the watchdog is probing right now
+        self._replacing = []  # configs of replacement browsers being launched in the background
+        self._lock = threading.Lock()
+        # Notified when a probe or a replacement launch finishes
+        self._idle_changed = threading.Condition(self._lock)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _launch(self, config: BrowserConfig) -> PooledBrowser:
+        proxy_ip = proxy_manager.acquire() if config.use_proxy else None
+        start_time = time.time()
+        try:
+            browser = PooledBrowser(config, proxy_ip)
+        except Exception:
+            proxy_manager.release(proxy_ip)
+            metrics.incr("browser_launch_failures")
+            raise
+        metrics.incr("browser_launches")
+        logger.info(
+            f"Launched browser pid={browser.pid} in {time.time() - start_time:.3f}s"
+        )
+        return browser
+
+    def _take_idle(self, config: BrowserConfig):
+        # A probe takes at most HEALTH_CHECK_TIMEOUT; don't launch a second Chrome meanwhile
+        deadline = time.time() + settings.HEALTH_CHECK_TIMEOUT + 1
+        with self._idle_changed:
+            while True:
+                # Most recently used first - it is the most likely to still be logged in
+                for browser in reversed(self._idle):
+                    if browser.config == config:
+                        self._idle.remove(browser)
+                        return browser
+                # A replacement is on its way to the idle list; a launch takes as long either way
+                if config in self._replacing:
+                    self._idle_changed.wait()
+                    continue
+                remaining = deadline - time.time()
+                if remaining <= 0 or not any(b.config == config for b in self._checking):
+                    return None
+                self._idle_changed.wait(remaining)
+
+    def acquire(self, config: BrowserConfig) -> PooledBrowser:
+        for _ in range(max(1, settings.HEALTH_CHECK_MAX_RETRIES)):
+            browser = self._take_idle(config)
+            if browser is None:
+                break
+            reason = self.watchdog.check_on_acquire(browser)
+            if not reason:
+                metrics.incr("browser_reuses")
+                return self._checkout(browser)
+            self._recycle(browser, reason)
+
+        return self._checkout(self._launch(config))
+
+    def _checkout(self, browser: PooledBrowser) -> PooledBrowser:
+        browser.jobs += 1
+        browser.last_used = time.time()
+        with self._lock:
+            self._busy.append(browser)
+        self._update_gauges()
+        return browser
+
+    def release(self, browser: PooledBrowser):
+        """Return a browser after a job; recycle it if it crossed a threshold"""
+        with self._lock:
+            if browser in self._busy:
+                self._busy.remove(browser)
+        browser.last_used = time.time()
+
+        reason = self.watchdog.recycle_reason(browser)
+        if reason:
+            self._recycle(browser, reason, replace=True)
+            return
+
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(browser)
+                browser = None
+        if browser:
+            self._recycle(browser, "pool_full")
+        self._update_gauges()
+
+    def discard(self, browser: PooledBrowser, reason: str):
+        with self._lock:
+            if browser in self._busy:
+                self._busy.remove(browser)
+        self._recycle(browser, reason)
+
+    def _recycle(self, browser: PooledBrowser, reason: str, replace: bool = False):
+        logger.info(f"Recycling browser pid={browser.pid}: {reason}")
+        metrics.incr("browser_recycles", reason=reason)
+        try:
+            browser.driver.close()
+        except Exception as e:
+            logger.error(
+                f"Error closing recycled browser: error={type(e).__name__}: {str(e)}"
+            )
+        finally:
+            proxy_manager.release(browser.proxy_ip)
+        self._update_gauges()
+
+        if replace and settings.AUTO_RECREATE_UNHEALTHY:
+            with self._lock:
+                self._replacing.append(browser.config)
+            threading.Thread(
+                target=self._replace, args=(browser.config,), daemon=True
+            ).start()
+
+    def _replace(self, config: BrowserConfig):
+        browser = None
+        try:
+            browser = self._launch(config)
+        except Exception as e:
+            logger.error(f"Failed to launch replacement browser: {e}")
+        with self._idle_changed:
+            self._replacing.remove(config)
+            if browser and len(self._idle) < self.max_idle:
+                self._idle.append(browser)
+                browser = None
+            # Wake acquire() either way; after a failed launch it starts its own browser
+            self._idle_changed.notify_all()
+        if browser:
+            self._recycle(browser, "pool_full")
+        self._update_gauges()
+
+    def _update_gauges(self):
+        with self._lock:
+            idle, busy = self._idle + self._checking, list(self._busy)
+        metrics.set("browsers_idle", len(idle))
+        metrics.set("browsers_busy", len(busy))
+        metrics.set("browser_rss_bytes", sum(b.rss for b in idle + busy))
+
+    def check(self):
+        """One watchdog pass: flag busy browsers, probe and expire idle ones"""
+        with self._lock:
+            busy = list(self._busy)
+            idle = list(self._idle)
+
+        for browser in busy:
+            reason = self.watchdog.recycle_reason(browser)
+            if reason and not browser.flagged:
+                logger.warning(
+                    f"Browser pid={browser.pid} flagged for recycling after current job: {reason}"
+                )
+                browser.flagged = reason
+
+        for browser in idle:
+            # Reserve one browser at a time; the others stay available to acquire()
+            with self._lock:
+                if browser not in self._idle:
+                    continue  # taken by a job since the snapshot
+                position = self._idle.index(browser)
+                self._idle.remove(browser)
+                self._checking.append(browser)
+
+            reason = None
+            try:
+                if time.time() - browser.last_used >= settings.BROWSER_IDLE_TTL:
+                    reason = "idle_timeout"
+                else:
+                    reason = self.watchdog.check_on_acquire(browser)
+            finally:
+                with self._idle_changed:
+                    self._checking.remove(browser)
+                    if not reason:
+                        self._idle.insert(min(position, len(self._idle)), browser)
+                    self._idle_changed.notify_all()
+
+            if reason:
+                self._recycle(browser, reason, replace=reason != "idle_timeout")
+        self._update_gauges()
+
+    def _watch(self):
+        while not self._stop.wait(settings.HEALTH_CHECK_INTERVAL):
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"Browser watchdog pass failed: {e}", exc_info=True)
+
+    def start_watchdog(self):
+        if self._thread or not settings.HEALTH_CHECK_ENABLED:
+            return
+        self._thread = threading.Thread(target=self._watch, daemon=True)
+        self._thread.start()
+        logger.info(
+            f"Browser watchdog started (interval={settings.HEALTH_CHECK_INTERVAL}s)"
+        )
+
+    def shutdown(self):
+        self._stop.set()
+        with self._lock:
+            browsers, self._idle = self._idle, []
+        for browser in browsers:
+            self._recycle(browser, "shutdown")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "idle": [b.to_dict() for b in self._idle + self._checking],
+                "busy": [b.to_dict() for b in self._busy],
+            }
+
+
+browser_pool = BrowserPool(max_idle=settings.BROWSER_POOL_SIZE)
 
 
 class BotasaurusBrowser:
     """Enhanced browser automation mixin with comprehensive error handling"""
 
-    def __init__(self, config: BrowserConfig = BrowserConfig()):
+    def __init__(self, config: BrowserConfig = BrowserConfig(), browser: PooledBrowser = None):
         try:
             self._cache = ElementCache()
             self.config = config
 
-            self.driver = Driver(
-                headless=not settings.LOCAL_DEV,
-                arguments=[
-                    "--no-sandbox",
-                    "--disable-dev-shm-usage",
-                    "--disable-gpu",
-                    "--disable-software-rasterizer",
-                    "--disable-extensions",
-                    "--headless=new",
-                    "--remote-debugging-port=9222",
-                    "--window-size=1920,1080"
-                ] if not settings.LOCAL_DEV else []
-            )
+            # A borrowed browser stays with its owner (e.g. one session shared across scrapers)
+            self._owns_browser = browser is None
+            self.browser = browser or browser_pool.acquire(config)
+            self.driver = self.browser.driver
+            self.proxy_ip = self.browser.proxy_ip
 
             self.is_initialized = True
         except Exception:
@@ -100,7 +363,7 @@ class BotasaurusBrowser:
             if multiple:
                 elements = parent.select_all(selector, wait=wait)
                 elapsed = time.time() - start_time
-                logger.info(
+                logger.debug(
                     f"Found {len(elements) if elements else 0} elements with selector '{selector}' in {elapsed:.3f}s"
                 )
                 return elements
@@ -126,6 +389,27 @@ class BotasaurusBrowser:
             )
             return None
 
+    # Error pages served by the portal (or its proxy/CDN) instead of the real page
+    THROTTLE_TITLES = ("429", "502", "503", "504", "too many requests", "service unavailable", "bad gateway", "gateway timeout")
+    THROTTLE_TEXT = ("too many requests", "rate limit exceeded", "service unavailable", "temporarily unavailable")
+    # Present on every real portal page (logged in or the login form); error pages have neither
+    PORTAL_LAYOUT = "#navbar-mobile, #LoginUsername"
+
+    def page_throttled(self) -> bool:
+        """True if the loaded page is a rate-limit or 5xx error page"""
+        try:
+            title, text = self.driver.run_js(
+                f"const layout = document.querySelector({json.dumps(self.PORTAL_LAYOUT)});"
+                " return [document.title || '', !layout && document.body ? document.body.innerText.slice(0, 500) : ''];"
+            )
+        except Exception as e:
+            logger.debug(f"Could not inspect page for throttling: {e}")
+            return False
+        title, text = (title or "").lower(), (text or "").lower()
+        # Status codes only count in the title; page text may contain arbitrary numbers, and is
+        # only read off non-portal pages so message or voicemail content can't match
+        return any(m in title for m in self.THROTTLE_TITLES) or any(m in text for m in self.THROTTLE_TEXT)
+
     def goto_page(self, url: str, timeout: int = 15, page_to_be: bool = True) -> bool:
         start_time = time.time()
         try:
@@ -139,7 +423,21 @@ class BotasaurusBrowser:
                 self._cache._cache.clear()
                 logger.debug(f"Cleared {cache_size} cached elements before navigation")
 
-            self.driver.get(url, wait=timeout)
+            self.browser.page_loads += 1
+            # No fixed wait= sleep: get() returns once the document is ready,
+            # so the proxy's latency sample is the navigation itself
+            with page_limiter.track() as call:
+                self.driver.get(url, timeout=timeout)
+                # get() doesn't raise on 429/5xx - the error page is what loads
+                if self.page_throttled():
+                    call.outcome = "throttled"
+            if call.outcome == "throttled":
+                proxy_manager.report(
+                    self.proxy_ip, time.time() - start_time, ok=False, error="throttled page"
+                )
+                logger.warning(f"Portal throttled navigation to {url}")
+                return False
+            proxy_manager.report(self.proxy_ip, time.time() - start_time, ok=True)
 
             if page_to_be:
                 result = self.driver.wait_for_page_to_be(url, wait=timeout)
@@ -156,6 +454,9 @@ class BotasaurusBrowser:
                 return True
         except Exception as e:
             elapsed = time.time() - start_time
+            proxy_manager.report(
+                self.proxy_ip, elapsed, ok=False, error=f"{type(e).__name__}: {e}"
+            )
             logger.error(
                 f"Navigation failed after {elapsed:.3f}s: url={url}, timeout={timeout}, error={type(e).__name__}: {str(e)}",
                 exc_info=True,
@@ -181,13 +482,13 @@ class BotasaurusBrowser:
                     Element(id=self._cache.store(selector, el), selector=selector)
                     for el in resp
                 ]
-                logger.info(
+                logger.debug(
                     f"Cached {len(cached_elements)} elements with selector '{selector}'"
                 )
                 return cached_elements
 
             cached_id = self._cache.store(selector, resp)
-            logger.info(
+            logger.debug(
                 f"Cached element with selector '{selector}', cache_id={cached_id}"
             )
             return Element(id=cached_id, selector=selector)
@@ -346,16 +647,41 @@ class BotasaurusBrowser:
             return False
 
 
-    def close(self):
+    def set_checkbox(self, selector, checked=True) -> bool:
+        """Click a checkbox only if its state differs, so toggles are idempotent"""
         try:
-            if hasattr(self, "driver"):
-                logger.info("Closing browser driver")
-                self.driver.close()
-                logger.info("Browser driver closed successfully")
-            else:
-                logger.warning("No driver attribute found during close")
+            current = self.driver.run_js(
+                f"const el = document.querySelector({json.dumps(selector)}); return el ? el.checked : null;"
+            )
+            if current is None:
+                logger.warning(f"Checkbox not found: selector={selector}")
+                return False
+            if bool(current) == checked:
+                logger.debug(f"Checkbox already {'checked' if checked else 'unchecked'}: {selector}")
+                return True
+            return self.click(selector)
         except Exception as e:
             logger.error(
-                f"Error closing browser driver: error={type(e).__name__}: {str(e)}",
+                f"Failed to set checkbox: selector={selector}, checked={checked}, error={type(e).__name__}: {str(e)}",
                 exc_info=True,
             )
+            return False
+
+    def release(self):
+        """Hand the browser back to the pool for the next job"""
+        if getattr(self, "browser", None) is None:
+            logger.warning("No browser attribute found during release")
+            return
+        if self._owns_browser:
+            logger.info("Releasing browser to pool")
+            browser_pool.release(self.browser)
+        self.browser = None
+
+    def close(self):
+        """Shut the browser down instead of returning it to the pool"""
+        if getattr(self, "browser", None) is None:
+            logger.warning("No browser attribute found during close")
+            return
+        logger.info("Closing browser driver")
+        browser_pool.discard(self.browser, "closed")
+        self.browser = None
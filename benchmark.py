@@ -0,0 +1,118 @@
+"""
+Micro-benchmark for the per-lookup and per-record hot paths.
+
+Compares the element handle/cache and the record model against their
+previous implementations (a pydantic Element with uuid4 cache ids, nested
+dicts per record), without a browser:
+
+    python benchmark.py [--n 100000]
+"""
+
+import argparse
+import json
+import threading
+import timeit
+import tracemalloc
+import uuid
+
+from pydantic import BaseModel, Field
+
+from base import ElementCache
+from records import CallRecord
+from schemas import Element
+
+
+class PydanticElement(BaseModel):
+    id: str = Field(...)
+    selector: str = Field(...)
+
+
+class UuidElementCache:
+    def __init__(self):
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def store(self, selector, element) -> str:
+        element_uuid = str(uuid.uuid4())
+        with self._lock:
+            self._cache[element_uuid] = {"element": element, "selector": selector}
+        return element_uuid
+
+
+ROW = {
+    "from_name": "Jane Doe", "from_number": "5551234567", "to": "100", "dialed_number": "100",
+    "date": "10/19/2026 09:15 AM", "duration": "1:23", "release_reason": "Normal",
+    "qos_inbound": "4.3", "qos_outbound": "4.2",
+}
+AUDIO = {"portal_url": "https://portal.invalid/a.mp3", "cloudinary_url": "https://res.invalid/a.mp3"}
+
+
+def dict_record():
+    return {
+        "from": {"name": ROW["from_name"], "number": ROW["from_number"]},
+        "to": ROW["to"],
+        "dialed_number": ROW["dialed_number"],
+        "date": ROW["date"],
+        "duration": ROW["duration"],
+        "release_reason": ROW["release_reason"],
+        "qos": {"inbound": ROW["qos_inbound"], "outbound": ROW["qos_outbound"]},
+        "audio": AUDIO,
+    }
+
+
+def slot_record():
+    record = CallRecord()
+    record.from_name = ROW["from_name"]
+    record.from_number = ROW["from_number"]
+    record.to = ROW["to"]
+    record.dialed_number = ROW["dialed_number"]
+    record.date = ROW["date"]
+    record.duration = ROW["duration"]
+    record.release_reason = ROW["release_reason"]
+    record.qos_inbound = ROW["qos_inbound"]
+    record.qos_outbound = ROW["qos_outbound"]
+    record.audio = AUDIO
+    return record
+
+
+def per_call_us(stmt, n) -> float:
+    return min(timeit.repeat(stmt, number=n, repeat=3)) / n * 1e6
+
+
+def retained_bytes(factory, n) -> float:
+    """Bytes per object while ``n`` of them are held (e.g. records waiting on audio in /sync)"""
+    tracemalloc.start()
+    held = [factory() for _ in range(n)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del held
+    return size / n
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-lookup and per-record overhead")
+    parser.add_argument("--n", type=int, default=100000)
+    n = parser.parse_args().n
+
+    old_cache, new_cache = UuidElementCache(), ElementCache()
+    rows = [
+        ("element lookup (handle + cache id)",
+         lambda: PydanticElement(id=old_cache.store("td", object()), selector="td"),
+         lambda: Element(id=new_cache.store("td", object()), selector="td")),
+        ("record build", dict_record, slot_record),
+        ("record build + serialize",
+         lambda: json.dumps({"type": "data", "record": dict_record()}),
+         lambda: f'{{"type": "data", "record": {slot_record().to_json()}}}'),
+    ]
+
+    print(f"{'':38} {'before':>10} {'after':>10} {'speedup':>8}")
+    for name, before, after in rows:
+        b, a = per_call_us(before, n), per_call_us(after, n)
+        print(f"{name:38} {b:8.2f}us {a:8.2f}us {b / a:7.2f}x")
+
+    b, a = retained_bytes(dict_record, n), retained_bytes(slot_record, n)
+    print(f"{'record held in memory':38} {b:9.0f}B {a:9.0f}B {b / a:7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
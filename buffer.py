@@ -0,0 +1,139 @@
+import tempfile
+import threading
+from collections import deque
+from typing import Iterator, Optional
+
+from config import logger, settings
+from metrics import metrics
+
+
+class SpillBuffer:
+    """Bounded in-memory FIFO of NDJSON lines that overflows to a temp file.
+
+    Once anything has spilled, new lines keep going to the file until the
+    reader has drained it, so ordering is preserved.
+    """
+
+    def __init__(self, max_lines: int, spill_dir: Optional[str] = None):
+        self.max_lines = max_lines
+        self.spill_dir = spill_dir or None
+        self.spilled_bytes = 0
+        self.closed = False
+        self.cancelled = False
+        self._memory = deque()
+        self._cond = threading.Condition()
+        self._file = None
+        self._read_pos = 0
+        self._write_pos = 0
+        self._pending = 0  # lines in the file not yet read
+
+    def __len__(self):
+        return len(self._memory) + self._pending
+
+    def put(self, line: str) -> bool:
+        """Append a line; returns False once the reader has gone away"""
+        with self._cond:
+            if self.cancelled:
+                return False
+            if self._pending or len(self._memory) >= self.max_lines:
+                self._spill(line)
+            else:
+                self._memory.append(line)
+            metrics.add("stream_buffer_depth", 1)
+            self._cond.notify()
+            return True
+
+    def _spill(self, line: str):
+        if self._file is None:
+            self._file = tempfile.TemporaryFile(dir=self.spill_dir)
+            logger.info("Stream buffer full, spilling to disk")
+        data = line.encode("utf-8")
+        self._file.seek(self._write_pos)
+        self._file.write(data)
+        self._write_pos += len(data)
+        self._pending += 1
+        self.spilled_bytes += len(data)
+        metrics.incr("stream_spill_bytes", len(data))
+
+    def get(self) -> Optional[str]:
+        """Next line, blocking until one is available; None when closed and drained"""
+        with self._cond:
+            while not self._memory and not self._pending and not self.closed:
+                self._cond.wait()
+
+            if self._memory:
+                line = self._memory.popleft()
+            elif self._pending:
+                self._file.seek(self._read_pos)
+                line = self._file.readline().decode("utf-8")
+                self._read_pos = self._file.tell()
+                self._pending -= 1
+                if not self._pending:
+                    # Drained - reuse the file from the start for the next spill
+                    self._file.seek(0)
+                    self._file.truncate()
+                    self._read_pos = self._write_pos = 0
+            else:
+                return None
+
+            metrics.add("stream_buffer_depth", -1)
+            return line
+
+    def __iter__(self) -> Iterator[str]:
+        while True:
+            line = self.get()
+            if line is None:
+                return
+            yield line
+
+    def close(self):
+        """Producer is done; the reader drains what is left"""
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def cancel(self):
+        """Reader is gone; drop everything and tell the producer to stop"""
+        with self._cond:
+            self.cancelled = True
+            self.closed = True
+            metrics.add("stream_buffer_depth", -len(self))
+            self._memory.clear()
+            self._pending = 0
+            if self._file:
+                self._file.close()
+                self._file = None
+            self._cond.notify_all()
+
+
+def buffered(lines: Iterator[str], name: str = "stream") -> Iterator[str]:
+    """Run ``lines`` on a producer thread at full speed and yield from a spill buffer.
+
+    The producer (and whatever browser and lock it holds) finishes as fast as
+    the scrape allows, independent of how quickly the client reads.
+    """
+    buffer = SpillBuffer(settings.STREAM_BUFFER_LINES, settings.STREAM_SPILL_DIR)
+
+    def produce():
+        metrics.add("stream_producers_active", 1)
+        try:
+            for line in lines:
+                if not buffer.put(line):
+                    logger.info(f"Client disconnected, stopping {name} producer")
+                    break
+        except Exception as e:
+            logger.error(f"{name} producer failed: {e}", exc_info=True)
+        finally:
+            # Runs the generator's cleanup (lock and browser release) on this thread
+            lines.close()
+            buffer.close()
+            metrics.add("stream_producers_active", -1)
+            if buffer.spilled_bytes:
+                logger.info(f"{name} producer finished, spilled {buffer.spilled_bytes} bytes")
+
+    threading.Thread(target=produce, name=f"{name}-producer", daemon=True).start()
+
+    try:
+        yield from buffer
+    finally:
+        buffer.cancel()
@@ -0,0 +1,38 @@
+import base64
+import binascii
+import json
+from typing import Optional
+
+CHECKPOINT_VERSION = 1
+
+
+def encode_checkpoint(kind: str, page: int, row: int, last_id: Optional[str], count: int) -> str:
+    """Opaque resume token: where the scrape was and how many records were sent"""
+    payload = {
+        "v": CHECKPOINT_VERSION,
+        "kind": kind,
+        "page": page,
+        "row": row,
+        "last_id": last_id,
+        "count": count,
+    }
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_checkpoint(token: str, kind: str) -> dict:
+    """Parse a resume token, raising ValueError if it is malformed or for another endpoint"""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (binascii.Error, UnicodeError, ValueError):
+        raise ValueError("Invalid resume token")
+
+    if not isinstance(payload, dict) or payload.get("v") != CHECKPOINT_VERSION:
+        raise ValueError("Unsupported resume token version")
+    if payload.get("kind") != kind:
+        raise ValueError(f"Resume token is for '{payload.get('kind')}', not '{kind}'")
+    for key in ("page", "row", "count"):
+        if not isinstance(payload.get(key), int) or payload[key] < 0:
+            raise ValueError(f"Invalid resume token field '{key}'")
+    return payload
@@ -97,11 +97,21 @@ class Settings(BaseSettings):
         0.00  # Delay between operations to reduce CPU spikes (seconds)
     )
 
+    # Startup Settings
+    PRELOAD_ON_STARTUP: bool = True  # Import scraper modules in the background at boot
+    PREWARM_BROWSER: bool = False  # Launch and log in one browser in the background at boot
+
     # Browser Health Check Settings
     HEALTH_CHECK_ENABLED: bool = True  # Enable health checks on browser acquisition
     HEALTH_CHECK_TIMEOUT: float = 1.0  # Max time for health check (seconds)
     HEALTH_CHECK_MAX_RETRIES: int = 3  # Max attempts to find healthy browser
     AUTO_RECREATE_UNHEALTHY: bool = True  # Automatically recreate unhealthy browsers
+    HEALTH_CHECK_INTERVAL: float = 30.0  # Seconds between background watchdog passes
+    BROWSER_MAX_RSS_MB: int = 1500  # Recycle when Chrome process tree exceeds this (0 disables)
+    BROWSER_MAX_PAGE_LOADS: int = 500  # Recycle after this many navigations (0 disables)
+    BROWSER_MAX_JOBS: int = 50  # Recycle after serving this many jobs (0 disables)
+    BROWSER_MAX_AGE: int = 3600  # Recycle browsers older than this (seconds, 0 disables)
+    BROWSER_IDLE_TTL: int = 900  # Close pooled browsers idle for this long (seconds)
 
     PROXY_USER: str = "msuppl"
     PROXY_PASS: str = "S0GYgQ8o"
@@ -116,6 +126,34 @@ class Settings(BaseSettings):
         "31.131.10.106",
     ]
 
+    # Proxy Rotation Settings
+    USE_PROXY: bool = False  # Route browser and audio downloads through PROXY_IPS
+    PROXY_LATENCY_ALPHA: float = 0.3  # EWMA smoothing factor for latency/error rate
+    PROXY_DEFAULT_LATENCY: float = 1.0  # Assumed latency for unmeasured proxies (seconds)
+    PROXY_ERROR_PENALTY: float = 4.0  # Score multiplier weight for error rate
+    PROXY_MAX_CONSECUTIVE_ERRORS: int = 3  # Errors in a row before quarantining
+    PROXY_BACKOFF_BASE: float = 30.0  # First quarantine duration (seconds)
+    PROXY_BACKOFF_MAX: float = 600.0  # Max quarantine duration (seconds)
+
+    STREAM_BUFFER_LINES: int = 1000  # NDJSON lines kept in memory per stream before spilling to disk
+    STREAM_SPILL_DIR: str = ""  # Directory for spill files (system temp dir if empty)
+    CHECKPOINT_EVERY: int = 25  # Emit a resume checkpoint every N streamed records
+    CHANGE_INDEX_PATH: str = "data/change_index.json"  # Persisted fingerprint index for /changes
+    EXTENSION_MAX_DIGITS: int = 6  # Caller numbers this short are internal extensions (outbound calls)
+    STRICT_RECORDS: bool = False  # Type-check every record before it is serialized (slower)
+
+    # Adaptive Concurrency (AIMD) Settings
+    LIMITER_INCREASE: float = 1.0  # Additive increase per window of healthy calls
+    LIMITER_BACKOFF: float = 0.5  # Multiplicative decrease on 429/5xx or timeouts
+    LIMITER_SLOW_BACKOFF: float = 0.9  # Gentler decrease when latency exceeds the target
+    LIMITER_LATENCY_ALPHA: float = 0.2  # EWMA smoothing factor for observed latency
+    PAGE_LIMIT_INITIAL: int = 1  # Starting concurrent page loads
+    PAGE_LIMIT_MAX: int = 4  # Ceiling for concurrent page loads
+    PAGE_LATENCY_TARGET: float = 5.0  # Page loads slower than this stop the limit growing (seconds)
+    AUDIO_LIMIT_INITIAL: int = 2  # Starting concurrent audio downloads
+    AUDIO_LIMIT_MAX: int = 8  # Ceiling for concurrent audio downloads (and /sync audio threads)
+    AUDIO_LATENCY_TARGET: float = 10.0  # Audio downloads slower than this stop the limit growing (seconds)
+
     # Mongotel Credentials
     MONGOTEL_USERNAME: str = ""
     MONGOTEL_PASSWORD: str = ""
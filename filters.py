@@ -0,0 +1,148 @@
+import re
+from datetime import datetime, time as dt_time
+from typing import Iterable, Optional
+
+from config import logger, settings
+
+# Date formats seen in the portal's call history table, most likely first
+PORTAL_DATE_FORMATS = (
+    "%m/%d/%Y %I:%M %p",
+    "%m/%d/%Y %I:%M:%S %p",
+    "%m/%d/%y %I:%M %p",
+    "%b %d, %Y %I:%M %p",
+    "%a %b %d, %Y %I:%M %p",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%d %H:%M",
+    "%m/%d/%Y",
+)
+
+DIRECTIONS = ("inbound", "outbound")
+
+
+class UnparsedDateError(ValueError):
+    """The first dated row didn't match any of PORTAL_DATE_FORMATS, so a date filter can't work"""
+
+
+def parse_portal_date(text: Optional[str]) -> Optional[datetime]:
+    if not text:
+        return None
+    text = " ".join(text.split())
+    for fmt in PORTAL_DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def parse_query_date(value: Optional[str], end_of_day: bool = False) -> Optional[datetime]:
+    """Parse an ISO date/datetime query parameter; bare dates cover the whole day"""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid date '{value}', expected ISO format (YYYY-MM-DD[THH:MM])")
+    if end_of_day and len(value) == 10:
+        parsed = datetime.combine(parsed.date(), dt_time.max)
+    return parsed.replace(tzinfo=None)
+
+
+def digits(value: Optional[str]) -> str:
+    return re.sub(r"\D", "", value or "")
+
+
+def call_direction(from_number: Optional[str]) -> str:
+    """Calls placed from an internal extension are outbound, everything else inbound"""
+    from_digits = digits(from_number)
+    if from_digits and len(from_digits) <= settings.EXTENSION_MAX_DIGITS:
+        return "outbound"
+    return "inbound"
+
+
+class CallFilter:
+    """Date range / number / direction filter for call history rows.
+
+    Rows arrive newest first, so a row older than ``since`` means every
+    following row (and page) is older too and the scrape can stop.
+    """
+
+    def __init__(
+        self,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        number: Optional[str] = None,
+        direction: Optional[str] = None,
+    ):
+        if direction and direction not in DIRECTIONS:
+            raise ValueError(f"Invalid direction '{direction}', expected one of: {', '.join(DIRECTIONS)}")
+        if since and until and since > until:
+            raise ValueError("'since' must not be later than 'until'")
+        if number is not None and not digits(number):
+            raise ValueError(f"Invalid number filter '{number}'")
+
+        self.since = since
+        self.until = until
+        self.number = digits(number) or None
+        self.direction = direction
+        self._parsed_any = False
+        self._warned_unparsed = False
+
+    @classmethod
+    def from_query(cls, since=None, until=None, number=None, direction=None) -> Optional["CallFilter"]:
+        """Build a filter from query parameters; None when nothing is filtered"""
+        call_filter = cls(
+            since=parse_query_date(since),
+            until=parse_query_date(until, end_of_day=True),
+            number=number,
+            direction=direction.lower() if direction else None,
+        )
+        return None if call_filter.is_empty() else call_filter
+
+    def is_empty(self) -> bool:
+        return not (self.since or self.until or self.number or self.direction)
+
+    @property
+    def needs_date(self) -> bool:
+        return bool(self.since or self.until)
+
+    @property
+    def needs_numbers(self) -> bool:
+        return bool(self.number or self.direction)
+
+    def check(self, date_text: Optional[str], from_number: Optional[str] = None, numbers: Iterable[Optional[str]] = ()) -> str:
+        """Classify a row: "match", "skip" or "stop" (nothing further can match)"""
+        if self.needs_date:
+            when = parse_portal_date(date_text)
+            if when is None:
+                # A format we don't know would otherwise skip every row and page the whole history
+                if not self._parsed_any:
+                    raise UnparsedDateError(
+                        f"Could not parse call date '{date_text}' with any known portal format; "
+                        f"the date filter can't be applied"
+                    )
+                if not self._warned_unparsed:
+                    logger.warning(f"Could not parse call date '{date_text}', excluding row from date filter")
+                    self._warned_unparsed = True
+                return "skip"
+            self._parsed_any = True
+            if self.since and when < self.since:
+                return "stop"
+            if self.until and when > self.until:
+                return "skip"
+
+        if self.direction and call_direction(from_number) != self.direction:
+            return "skip"
+
+        if self.number and not any(self.number in digits(n) for n in (from_number, *numbers)):
+            return "skip"
+
+        return "match"
+
+    def to_dict(self) -> dict:
+        return {
+            "since": self.since.isoformat() if self.since else None,
+            "until": self.until.isoformat() if self.until else None,
+            "number": self.number,
+            "direction": self.direction,
+        }
@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import uuid
+from typing import Optional
+
+from config import logger, settings
+from records import Record
+
+# Fields that identify a record across scrapes (dotted paths into the record dict)
+KEY_FIELDS = {
+    "calls": ("date", "from.number", "dialed_number", "duration"),
+    "voicemails": ("date", "number", "duration"),
+    "messages": ("number", "time"),
+}
+
+MISSING = object()
+
+
+def _get(record, path: str):
+    if isinstance(record, Record):
+        return record.value(path, MISSING)
+    value = record
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return MISSING
+        value = value[part]
+    return value
+
+
+def _digest(payload) -> str:
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=True, separators=(",", ":"))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def record_id(kind: str, record) -> Optional[str]:
+    """Stable identity of a record; None if a key field was projected away"""
+    values = [_get(record, path) for path in KEY_FIELDS[kind]]
+    if any(v is MISSING for v in values):
+        return None
+    return _digest([kind, *values])
+
+
+def content_hash(record) -> str:
+    """Hash of a record's content, ignoring audio (Cloudinary URLs are new on every upload)"""
+    if isinstance(record, Record):
+        record = record.to_dict()
+    return _digest({k: v for k, v in record.items() if k not in ("id", "audio")})
+
+
+class ChangeIndex:
+    """Compact persisted index of record fingerprints for the /changes feed.
+
+    Every added or changed record gets the next sequence number. A sync
+    token is ``<epoch>.<seq>``; the epoch changes whenever the index is
+    recreated so stale tokens fall back to a full sync.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.epoch = uuid.uuid4().hex[:8]
+        self.seq = 0
+        self._records = {kind: {} for kind in KEY_FIELDS}  # kind -> id -> [hash, seq]
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.epoch = data["epoch"]
+            self.seq = data["seq"]
+            for kind, entries in data["records"].items():
+                self._records.setdefault(kind, {}).update(entries)
+            logger.info(f"Loaded change index: seq={self.seq}, path={self.path}")
+        except Exception as e:
+            logger.error(f"Could not load change index {self.path}, starting fresh: {e}")
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            # Serialize under the lock so concurrent observe() calls can't mutate mid-dump
+            data = json.dumps(
+                {"epoch": self.epoch, "seq": self.seq, "records": self._records},
+                separators=(",", ":"),
+            )
+            self._dirty = False
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+    def observe(self, kind: str, rid: str, chash: str):
+        """Record a sighting; returns (seq, change) where change is "added", "changed" or None"""
+        with self._lock:
+            entry = self._records[kind].get(rid)
+            if entry and entry[0] == chash:
+                return entry[1], None
+            self.seq += 1
+            self._records[kind][rid] = [chash, self.seq]
+            self._dirty = True
+            return self.seq, "changed" if entry else "added"
+
+    def token(self) -> str:
+        return f"{self.epoch}.{self.seq}"
+
+    def parse_token(self, token: Optional[str]) -> int:
+        """Sequence number a client has seen; 0 (full sync) for missing or stale tokens"""
+        if not token:
+            return 0
+        epoch, _, seq = token.partition(".")
+        if epoch != self.epoch or not seq.isdigit():
+            logger.info(f"Sync token {token!r} is from another index, doing a full sync")
+            return 0
+        return int(seq)
+
+
+class ChangeFeed:
+    """Record filter for one /changes request: keeps records newer than the client's token"""
+
+    def __init__(self, index: ChangeIndex, kind: str, since_seq: int):
+        self.index = index
+        self.kind = kind
+        self.since_seq = since_seq
+        self.changes = {}  # id -> "added" / "changed"
+
+    def __call__(self, record) -> bool:
+        rid = record_id(self.kind, record)
+        if rid is None:
+            return False
+        seq, change = self.index.observe(self.kind, rid, content_hash(record))
+        if seq <= self.since_seq:
+            return False
+        # Unchanged in this scrape but changed after the client's token
+        self.changes[rid] = change or "changed"
+        return True
+
+
+change_index = ChangeIndex(settings.CHANGE_INDEX_PATH)
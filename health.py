@@ -0,0 +1,97 @@
+import threading
+import time
+from typing import Optional
+
+import psutil
+
+from config import logger, settings
+from proxy import proxy_manager
+
+
+def process_tree_rss(pid: Optional[int]) -> int:
+    """Resident memory (bytes) of a Chrome process and all its children"""
+    if not pid:
+        return 0
+    try:
+        root = psutil.Process(pid)
+        processes = [root] + root.children(recursive=True)
+    except psutil.Error:
+        return 0
+
+    total = 0
+    for proc in processes:
+        try:
+            total += proc.memory_info().rss
+        except psutil.Error:
+            # Renderer processes come and go while we iterate
+            continue
+    return total
+
+
+def probe(driver, timeout: float = None) -> bool:
+    """Check the browser answers a trivial script within ``timeout`` seconds"""
+    timeout = timeout if timeout is not None else settings.HEALTH_CHECK_TIMEOUT
+    result = {}
+
+    def run():
+        try:
+            result["value"] = driver.run_js("return 1")
+        except Exception as e:
+            result["error"] = e
+
+    # A hung CDP call never returns, so run it on a daemon thread we can abandon
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout)
+
+    if thread.is_alive():
+        logger.warning(f"Browser probe timed out after {timeout:.1f}s")
+        return False
+    if "error" in result:
+        logger.warning(
+            f"Browser probe failed: {type(result['error']).__name__}: {result['error']}"
+        )
+        return False
+    return result.get("value") == 1
+
+
+class BrowserWatchdog:
+    """Decides when a pooled browser should be recycled.
+
+    Thresholds are only evaluated between jobs; a browser that crosses one
+    mid-scrape is flagged and recycled when it is released.
+    """
+
+    def sample(self, browser) -> int:
+        browser.rss = process_tree_rss(browser.pid)
+        return browser.rss
+
+    def recycle_reason(self, browser) -> Optional[str]:
+        if browser.flagged:
+            return browser.flagged
+        if settings.BROWSER_MAX_RSS_MB and self.sample(browser) > (
+            settings.BROWSER_MAX_RSS_MB * 1024 * 1024
+        ):
+            return "rss_limit"
+        if settings.BROWSER_MAX_PAGE_LOADS and (
+            browser.page_loads >= settings.BROWSER_MAX_PAGE_LOADS
+        ):
+            return "page_limit"
+        if settings.BROWSER_MAX_JOBS and browser.jobs >= settings.BROWSER_MAX_JOBS:
+            return "job_limit"
+        if settings.BROWSER_MAX_AGE and (
+            time.time() - browser.created_at >= settings.BROWSER_MAX_AGE
+        ):
+            return "max_age"
+        if not proxy_manager.is_available(browser.proxy_ip):
+            return "proxy_quarantined"
+        return None
+
+    def check_on_acquire(self, browser) -> Optional[str]:
+        """Cheap pre-job check: thresholds plus a responsiveness probe"""
+        reason = self.recycle_reason(browser)
+        if reason:
+            return reason
+        if settings.HEALTH_CHECK_ENABLED and not probe(browser.driver):
+            return "unresponsive"
+        return None
@@ -0,0 +1,137 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from config import logger, settings
+from metrics import metrics
+
+# Outcomes that mean "the portal wants us to slow down"
+BACKOFF_OUTCOMES = ("throttled", "timeout")
+
+
+def classify_exception(e: Exception) -> str:
+    response = getattr(e, "response", None)
+    status = getattr(response, "status_code", None)
+    if status == 429 or (status is not None and status >= 500):
+        return "throttled"
+    if isinstance(e, TimeoutError) or "Timeout" in type(e).__name__:
+        return "timeout"
+    return "error"
+
+
+class Call:
+    """Handle for one limited operation; set ``outcome`` to report throttling"""
+
+    __slots__ = ("outcome",)
+
+    def __init__(self):
+        self.outcome = "ok"
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit for requests to the portal.
+
+    The limit grows by ~1 per window of successful calls made at full
+    concurrency while latency stays under ``latency_target`` and is cut multiplicatively on throttling
+    (429/5xx) or timeouts, at most once per observed latency so a single burst
+    of failures doesn't collapse it to the floor.
+    """
+
+    def __init__(self, name: str, initial: float, min_limit: int, max_limit: int, latency_target: float):
+        self.name = name
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.in_flight = 0
+        self.latency_ewma = None
+        self.calls = 0
+        self.outcomes = {}
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, latency: float, outcome: str = "ok"):
+        with self._cond:
+            # Only probe for more capacity if this call was actually using the limit
+            saturated = self.in_flight >= int(self.limit)
+            self.in_flight -= 1
+            self.calls += 1
+            self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+
+            if outcome == "ok":
+                alpha = settings.LIMITER_LATENCY_ALPHA
+                self.latency_ewma = (
+                    latency
+                    if self.latency_ewma is None
+                    else (1 - alpha) * self.latency_ewma + alpha * latency
+                )
+                if self.latency_ewma > self.latency_target:
+                    self._decrease("slow", settings.LIMITER_SLOW_BACKOFF)
+                elif saturated:
+                    self.limit = min(self.max_limit, self.limit + settings.LIMITER_INCREASE / self.limit)
+            elif outcome in BACKOFF_OUTCOMES:
+                self._decrease(outcome, settings.LIMITER_BACKOFF)
+
+            metrics.set("limiter_limit", round(self.limit, 2), limiter=self.name)
+            metrics.incr("limiter_calls", limiter=self.name, outcome=outcome)
+            self._cond.notify_all()
+
+    def _decrease(self, reason: str, factor: float):
+        now = time.time()
+        # One cut per round trip: calls already in flight were sent at the old limit
+        if now - self._last_decrease < (self.latency_ewma or self.latency_target):
+            return
+        previous = self.limit
+        self.limit = max(self.min_limit, self.limit * factor)
+        self._last_decrease = now
+        if int(self.limit) != int(previous):
+            logger.warning(f"{self.name} limiter backing off ({reason}): {previous:.1f} -> {self.limit:.1f}")
+
+    @contextmanager
+    def track(self):
+        """Hold a slot for the duration of one call and feed its latency/outcome back"""
+        self.acquire()
+        call = Call()
+        start_time = time.time()
+        try:
+            yield call
+        except Exception as e:
+            call.outcome = classify_exception(e)
+            raise
+        finally:
+            self.release(time.time() - start_time, call.outcome)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "limit": round(self.limit, 2),
+                "in_flight": self.in_flight,
+                "min": self.min_limit,
+                "max": self.max_limit,
+                "latency_ms": round(self.latency_ewma * 1000, 1) if self.latency_ewma is not None else None,
+                "latency_target_ms": round(self.latency_target * 1000, 1),
+                "calls": self.calls,
+                "outcomes": dict(self.outcomes),
+            }
+
+
+page_limiter = AdaptiveLimiter(
+    "page_loads",
+    initial=settings.PAGE_LIMIT_INITIAL,
+    min_limit=1,
+    max_limit=settings.PAGE_LIMIT_MAX,
+    latency_target=settings.PAGE_LATENCY_TARGET,
+)
+audio_limiter = AdaptiveLimiter(
+    "audio_downloads",
+    initial=settings.AUDIO_LIMIT_INITIAL,
+    min_limit=1,
+    max_limit=settings.AUDIO_LIMIT_MAX,
+    latency_target=settings.AUDIO_LATENCY_TARGET,
+)
@@ -0,0 +1,426 @@
+"""
+Load-test harness for the streaming endpoints.
+
+Starts the API in a subprocess against a stand-in portal (no Chrome, no
+Mongotel login: synthetic rows with configurable login/page/row delays and a
+local HTTP server for recordings) and a stand-in upload backend, drives it
+with concurrent clients and reports time-to-first-record, full-stream latency
+percentiles, busy-rejection rate and server RSS over time.
+
+The server side is the real app - lock, browser pool, spill buffer, limiters
+and the audio download path all run (stand-in page loads go through
+goto_page, recordings through the real HTTP download); only Chrome/the
+portal and Cloudinary are replaced.
+
+Examples:
+    python loadtest.py --endpoint call_history --concurrency 10 --requests 40
+    python loadtest.py --endpoint sync --pattern poisson --rate 0.5 --requests 20
+    python loadtest.py --target http://localhost:8000 --server-pid 1234 ...
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PATTERNS = ("closed", "poisson", "burst")
+ENDPOINTS = ("call_history", "voicemails", "messages", "sync")
+
+
+# ---------------------------------------------------------------------------
+# Stand-in portal (runs inside the server subprocess)
+# ---------------------------------------------------------------------------
+
+
+class StandinDriver:
+    """Just enough of botasaurus' Driver for the pool and health checks"""
+
+    def __init__(self, args):
+        self.args = args
+        # Stand in for Chrome's memory so RSS numbers move with pool size
+        self._ballast = bytearray(args.browser_mb * 1024 * 1024)
+        self._browser = type("Browser", (), {"_process_pid": None})()
+        self.current_url = ""
+        self.title = ""
+
+    def get(self, url, timeout=None, wait=None):
+        time.sleep(self.args.page_delay)
+        self.current_url = url
+        throttled = random.random() < self.args.page_throttle_rate
+        self.title = "429 Too Many Requests" if throttled else "Stand-in portal"
+
+    def wait_for_page_to_be(self, url, wait=None):
+        return True
+
+    def run_js(self, script, *args, **kwargs):
+        if "document.title" in script:
+            return [self.title, ""]
+        return 1
+
+    def get_cookies(self):
+        return [{"name": "sessionid", "value": "standin"}]
+
+    def close(self):
+        self._ballast = None
+
+
+def serve_audio(port: int, args):
+    payload = os.urandom(args.audio_kb * 1024)
+
+    class AudioHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(args.audio_delay)
+            if random.random() < args.throttle_rate:
+                self.send_response(429)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "audio/mpeg")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *a):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), AudioHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+
+def install_standins(args):
+    """Swap Chrome, the portal and Cloudinary for stand-ins, keep everything else"""
+    import base
+    import startup
+    from records import CallRecord, MessageRecord, VoicemailRecord
+
+    scraper = startup.load_scrapers()
+    base.launch_driver = lambda proxy_ip=None: StandinDriver(args)
+
+    def standin_upload(audio_bytes):
+        time.sleep(args.upload_delay)
+        return f"https://standin.invalid/{len(audio_bytes)}.mp3"
+
+    scraper.upload_to_cloudinary = standin_upload
+    audio_base = f"http://127.0.0.1:{args.audio_port}/audio"
+
+    record_classes = {"calls": CallRecord, "voicemails": VoicemailRecord, "messages": MessageRecord}
+    # API fields backed by more than one record slot
+    field_slots = {"from": ("from_name", "from_number"), "qos": ("qos_inbound", "qos_outbound")}
+
+    def make_record(kind, n, wanted):
+        stamp = time.strftime("%m/%d/%Y %I:%M %p", time.localtime(time.time() - n * 60))
+        number = f"555{n:07d}"
+        if kind == "calls":
+            values = {
+                "from_name": f"Caller {n}",
+                "from_number": number,
+                "to": "100",
+                "dialed_number": "100",
+                "date": stamp,
+                "duration": f"0:{n % 60:02d}",
+                "release_reason": "Normal",
+                "qos_inbound": "4.3",
+                "qos_outbound": "4.2",
+            }
+        elif kind == "voicemails":
+            values = {"name": f"Caller {n}", "number": number, "date": stamp, "duration": f"0:{n % 60:02d}"}
+        else:
+            values = {"number": number, "message": f"Stand-in message {n}", "time": stamp}
+
+        record = record_classes[kind]()
+        for field in wanted:
+            for slot in field_slots.get(field, (field,)):
+                if slot in values:
+                    setattr(record, slot, values[slot])
+        return record
+
+    def standin_class(real_class):
+        class Standin(real_class):
+            def login(self):
+                if not self.browser.logged_in:
+                    time.sleep(args.login_delay)
+                    self.browser.logged_in = True
+
+            def scrape_generator(self, limit=50, fields=None, include_audio=True, record_filter=None, resume=None, call_filter=None):
+                try:
+                    wanted = self.resolve_fields(fields, include_audio)
+                    self.seed_position(resume)
+                    self.login()
+                    start = resume["page"] * args.page_size - args.page_size + resume["row"] if resume else 0
+                    count = 0
+                    for n in range(start, args.rows):
+                        if count >= limit:
+                            return
+                        if n % args.page_size == 0:
+                            # Through goto_page, so the page limiter and proxy stats see it
+                            page = n // args.page_size + 1
+                            self.open_page(f"https://portal.invalid/{self.KIND}?page={page}", page_to_be=False)
+                        time.sleep(args.row_delay)
+                        self.position = {"page": n // args.page_size + 1, "row": n % args.page_size + 1}
+
+                        record = make_record(self.KIND, n, wanted)
+                        if record_filter and not record_filter(record):
+                            continue
+                        if "audio" in wanted:
+                            record.audio = self.process_audio(f"{audio_base}/{self.KIND}/{n}")
+                        yield record
+                        count += 1
+                finally:
+                    self.release()
+
+        Standin.__name__ = real_class.__name__
+        return Standin
+
+    for name in ("CallHistory", "VoicemailScraper", "ChatSmsScraper"):
+        setattr(scraper, name, standin_class(getattr(scraper, name)))
+
+
+def serve(args):
+    import uvicorn
+
+    serve_audio(args.audio_port, args)
+    install_standins(args)
+    import main
+
+    uvicorn.run(main.app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+# ---------------------------------------------------------------------------
+# Load generator
+# ---------------------------------------------------------------------------
+
+
+class Result:
+    __slots__ = ("started", "ttfr", "total", "records", "busy", "error")
+
+    def __init__(self, started):
+        self.started = started
+        self.ttfr = None
+        self.total = None
+        self.records = 0
+        self.busy = False
+        self.error = None
+
+
+def run_client(session, url: str, started: float) -> Result:
+    result = Result(started)
+    try:
+        with session.get(url, stream=True, timeout=600) as response:
+            response.raise_for_status()
+            for raw in response.iter_lines():
+                if not raw:
+                    continue
+                line = json.loads(raw)
+                if line.get("status") == "error" and "busy" in line.get("message", ""):
+                    result.busy = True
+                elif line.get("type") == "error":
+                    result.error = line.get("message")
+                elif line.get("type") == "data":
+                    if result.ttfr is None:
+                        result.ttfr = time.time() - started
+                    result.records += 1
+    except Exception as e:
+        result.error = f"{type(e).__name__}: {e}"
+    result.total = time.time() - started
+    return result
+
+
+def arrival_times(pattern: str, count: int, rate: float):
+    """Offsets (seconds from start) at which open-loop requests are sent"""
+    if pattern == "burst":
+        return [0.0] * count
+    offsets, t = [], 0.0
+    for _ in range(count):
+        offsets.append(t)
+        t += random.expovariate(rate)
+    return offsets
+
+
+def sample_rss(pid: int, samples: list, stop: threading.Event, interval: float):
+    import psutil
+
+    try:
+        proc = psutil.Process(pid)
+    except psutil.Error:
+        return
+    start = time.time()
+    while not stop.is_set():
+        try:
+            rss = proc.memory_info().rss + sum(c.memory_info().rss for c in proc.children(recursive=True))
+        except psutil.Error:
+            break
+        samples.append((round(time.time() - start, 2), rss))
+        stop.wait(interval)
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return round(ordered[index], 3)
+
+
+def summarize(results, samples, wall):
+    done = [r for r in results if not r.busy and not r.error]
+    ttfr = [r.ttfr for r in done if r.ttfr is not None]
+    totals = [r.total for r in done]
+    rss_mb = [round(rss / (1024 * 1024), 1) for _, rss in samples]
+    return {
+        "requests": len(results),
+        "completed": len(done),
+        "busy_rejections": sum(r.busy for r in results),
+        "busy_rejection_rate": round(sum(r.busy for r in results) / len(results), 3) if results else 0,
+        "errors": sum(1 for r in results if r.error),
+        "records": sum(r.records for r in results),
+        "records_per_second": round(sum(r.records for r in results) / wall, 2) if wall else None,
+        "wall_seconds": round(wall, 2),
+        "time_to_first_record": {p: percentile(ttfr, int(p[1:])) for p in ("p50", "p90", "p99")},
+        "full_stream_latency": {p: percentile(totals, int(p[1:])) for p in ("p50", "p90", "p99")},
+        "server_rss_mb": {
+            "start": rss_mb[0] if rss_mb else None,
+            "max": max(rss_mb) if rss_mb else None,
+            "end": rss_mb[-1] if rss_mb else None,
+            "series": [(t, round(rss / (1024 * 1024), 1)) for t, rss in samples],
+        },
+    }
+
+
+def wait_until_ready(base_url: str, timeout: float = 60):
+    import requests
+
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(f"{base_url}/readyz", timeout=2).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Server at {base_url} did not become ready within {timeout}s")
+
+
+def drive(args, base_url: str, server_pid):
+    import requests
+
+    url = f"{base_url}/{args.endpoint}?limit={args.limit}&include_audio={str(args.audio).lower()}"
+    results, lock = [], threading.Lock()
+    samples, stop = [], threading.Event()
+    if server_pid:
+        threading.Thread(target=sample_rss, args=(server_pid, samples, stop, args.sample_interval), daemon=True).start()
+
+    def record(result):
+        with lock:
+            results.append(result)
+        status = "busy" if result.busy else ("error" if result.error else "ok")
+        print(f"  {status:5} records={result.records:4} ttfr={result.ttfr or 0:.2f}s total={result.total:.2f}s", file=sys.stderr)
+
+    start = time.time()
+    if args.pattern == "closed":
+        # Each virtual user sends its next request as soon as the previous one ends
+        remaining = iter(range(args.requests))
+        remaining_lock = threading.Lock()
+
+        def user():
+            session = requests.Session()
+            while True:
+                with remaining_lock:
+                    if next(remaining, None) is None:
+                        return
+                record(run_client(session, url, time.time()))
+
+        threads = [threading.Thread(target=user) for _ in range(args.concurrency)]
+    else:
+        offsets = arrival_times(args.pattern, args.requests, args.rate)
+
+        def arrival(offset):
+            time.sleep(max(0.0, start + offset - time.time()))
+            record(run_client(requests.Session(), url, time.time()))
+
+        threads = [threading.Thread(target=arrival, args=(o,)) for o in offsets]
+
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.time() - start
+
+    # Keep sampling briefly so RSS after the load (pool, buffers) is visible
+    time.sleep(args.sample_interval * 2)
+    stop.set()
+    return summarize(results, samples, wall)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the scraper API with a stand-in portal")
+    parser.add_argument("mode", nargs="?", choices=("run", "serve"), default="run", help=argparse.SUPPRESS)
+    parser.add_argument("--endpoint", choices=ENDPOINTS, default="call_history")
+    parser.add_argument("--pattern", choices=PATTERNS, default="closed",
+                        help="closed: N users looping; poisson: open-loop arrivals at --rate/s; burst: all at once")
+    parser.add_argument("--concurrency", type=int, default=10, help="virtual users for the closed pattern")
+    parser.add_argument("--requests", type=int, default=40, help="total requests to send")
+    parser.add_argument("--rate", type=float, default=1.0, help="arrivals per second for the poisson pattern")
+    parser.add_argument("--limit", type=int, default=50, help="?limit= per request")
+    parser.add_argument("--no-audio", dest="audio", action="store_false", help="send include_audio=false")
+    parser.add_argument("--target", help="drive an already running server instead of starting one")
+    parser.add_argument("--server-pid", type=int, help="PID to sample RSS from when using --target")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--audio-port", type=int, default=8766)
+    parser.add_argument("--sample-interval", type=float, default=0.5, help="RSS sampling interval (seconds)")
+    parser.add_argument("--json", dest="json_path", help="also write the report to this file")
+    parser.add_argument("--server-log", help="file for the server subprocess output (default: discard)")
+
+    portal = parser.add_argument_group("stand-in portal")
+    portal.add_argument("--rows", type=int, default=500, help="rows available per section")
+    portal.add_argument("--page-size", type=int, default=25)
+    portal.add_argument("--login-delay", type=float, default=2.0)
+    portal.add_argument("--page-delay", type=float, default=1.0)
+    portal.add_argument("--page-throttle-rate", type=float, default=0.0, help="fraction of page loads served a 429 page (the stream ends with an error line)")
+    portal.add_argument("--row-delay", type=float, default=0.02)
+    portal.add_argument("--audio-delay", type=float, default=0.2, help="recording download latency")
+    portal.add_argument("--audio-kb", type=int, default=256, help="recording size")
+    portal.add_argument("--throttle-rate", type=float, default=0.0, help="fraction of downloads answered 429")
+    portal.add_argument("--upload-delay", type=float, default=0.3, help="stand-in Cloudinary upload latency")
+    portal.add_argument("--browser-mb", type=int, default=150, help="memory ballast per stand-in browser")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.mode == "serve":
+        serve(args)
+        return
+
+    server = None
+    if args.target:
+        base_url, server_pid = args.target.rstrip("/"), args.server_pid
+    else:
+        argv = sys.argv[1:] if argv is None else list(argv)
+        log = open(args.server_log, "w") if args.server_log else subprocess.DEVNULL
+        server = subprocess.Popen([sys.executable, os.path.abspath(__file__), "serve", *argv], stdout=log, stderr=subprocess.STDOUT)
+        base_url, server_pid = f"http://127.0.0.1:{args.port}", server.pid
+
+    try:
+        wait_until_ready(base_url)
+        print(f"Driving {base_url}/{args.endpoint}: pattern={args.pattern} requests={args.requests}", file=sys.stderr)
+        report = drive(args, base_url, server_pid)
+    finally:
+        if server:
+            server.terminate()
+            server.wait(timeout=10)
+
+    series = report["server_rss_mb"].pop("series")
+    print(json.dumps(report, indent=2))
+    report["server_rss_mb"]["series"] = series
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,21 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
-from scraper import CallHistory, VoicemailScraper, ChatSmsScraper
+from fastapi.responses import JSONResponse, StreamingResponse
+from buffer import buffered
+from checkpoint import decode_checkpoint, encode_checkpoint
+from config import settings
+from filters import CallFilter
+from fingerprint import ChangeFeed, change_index, record_id
+from limiter import audio_limiter, page_limiter
+from metrics import metrics
+from proxy import proxy_manager
+from schemas import BrowserConfig
+import startup
 import json
+import queue
 import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional
 import traceback
 import time
 
@@ -20,6 +32,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Heavy modules (scraper -> base -> botasaurus) load in the background, see startup.py
+@app.on_event("startup")
+def start_warm_up():
+    startup.start()
+
+@app.on_event("shutdown")
+def close_browser_pool():
+    pool = startup.browser_pool()
+    if pool:
+        pool.shutdown()
+
 @app.api_route("/", methods=["GET", "HEAD"])
 def health_check():
     return {"status": "ok", "service": "mongotel_scraper"}
@@ -28,62 +51,266 @@ def health_check():
 def health_check_z():
     return {"status": "ok", "service": "mongotel_scraper"}
 
-def stream_generator(bot_class, limit):
-    """
-    Generator wrapper that handles locking and conversion to NDJSON.
-    """
+@app.api_route("/readyz", methods=["GET", "HEAD"])
+def readiness_check():
+    status = startup.state.to_dict()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+@app.get("/metrics")
+def get_metrics():
+    pool = startup.browser_pool()
+    return {**metrics.snapshot(), "browsers": pool.stats() if pool else None}
+
+@app.get("/limits")
+def concurrency_limits():
+    return {limiter.name: limiter.stats() for limiter in (page_limiter, audio_limiter)}
+
+@app.get("/proxies")
+def proxy_stats():
+    return {"enabled": settings.USE_PROXY, "proxies": proxy_manager.stats()}
+
+BUSY_LINE = json.dumps({"status": "error", "message": "Server is busy. Please try again later."}) + "\n"
+
+def acquire_scraper_lock():
     # Attempt to acquire lock with retries
-    acquired = False
     for i in range(5):
         if scraper_lock.acquire(blocking=False):
-            acquired = True
-            break
+            return True
         print(f"🔒 Server busy. Waiting for lock... (Attempt {i+1}/5)")
         time.sleep(1)
+    return False
 
-    if not acquired:
-        yield json.dumps({"status": "error", "message": "Server is busy. Please try again later."}) + "\n"
+def stream_generator(bot_class, limit, change_feed=None, **scrape_options):
+    """
+    Generator wrapper that handles locking and conversion to NDJSON.
+    With a change_feed, only added/changed records are emitted and the final
+    meta line carries the next sync token. Checkpoint lines let a client
+    resume from where a failed stream stopped.
+    """
+    if not acquire_scraper_lock():
+        yield BUSY_LINE
         return
 
+    resume = scrape_options.get("resume")
+    sent_before = resume["count"] if resume else 0
+    count = 0
+    bot = None
+    last_id = resume.get("last_id") if resume else None
+
+    def checkpoint():
+        position = bot.position if bot else resume or {"page": 1, "row": 0}
+        return encode_checkpoint(bot_class.KIND, position["page"], position["row"], last_id, sent_before + count)
+
     try:
         print(f"🔒 Lock acquired for {bot_class.__name__} (Limit: {limit})")
-        bot = bot_class()
+        bot = bot_class(BrowserConfig(use_proxy=settings.USE_PROXY))
         # Yield metadata first (optional, but helpful for client initialization)
-        yield json.dumps({"type": "meta", "status": "started", "limit": limit}) + "\n"
+        call_filter = scrape_options.get("call_filter")
+        yield json.dumps({
+            "type": "meta",
+            "status": "started",
+            "limit": limit,
+            "fields": scrape_options.get("fields"),
+            "filter": call_filter.to_dict() if call_filter else None,
+            "resumed_from": sent_before if resume else None,
+        }) + "\n"
         
-        count = 0
-        for record in bot.scrape_generator(limit=limit):
-            yield json.dumps({"type": "data", "record": record}) + "\n"
+        if change_feed:
+            scrape_options["record_filter"] = change_feed
+
+        for record in bot.scrape_generator(limit=limit - sent_before, **scrape_options):
+            rid = record_id(bot_class.KIND, record)
+            if rid:
+                record.id = rid
+                last_id = rid
+            # Records serialize themselves; only the envelope goes through json
+            change = f', "change": {json.dumps(change_feed.changes.get(rid))}' if change_feed else ""
+            yield f'{{"type": "data", "record": {record.to_json()}{change}}}\n'
             count += 1
-        
-        yield json.dumps({"type": "meta", "status": "completed", "count": count}) + "\n"
+
+            if count % settings.CHECKPOINT_EVERY == 0:
+                yield json.dumps({"type": "checkpoint", "token": checkpoint(), "count": sent_before + count}) + "\n"
+
+        completed = {"type": "meta", "status": "completed", "count": count}
+        if change_feed:
+            change_index.save()
+            completed["sync_token"] = change_index.token()
+        yield json.dumps(completed) + "\n"
         print(f"✅ Stream finished. Sent {count} records.")
 
     except Exception as e:
         error_details = traceback.format_exc()
         print(f"❌ Stream Error: {e}")
+        # Hand back a checkpoint so the client can retry only the remaining work
+        yield json.dumps({"type": "error", "message": str(e), "details": error_details, "resume": checkpoint()}) + "\n"
+    finally:
+        scraper_lock.release()
+        print("🔓 Lock released")
+        if change_feed:
+            change_index.save()
+
+def sync_generator(kinds, limit, include_audio):
+    """
+    One browser session for several sections, multiplexed into one NDJSON
+    stream. Audio copies run on a thread pool (throttled by the adaptive
+    audio limiter) while the browser moves on, so records with recordings
+    are emitted when their upload finishes.
+    """
+    if not acquire_scraper_lock():
+        yield BUSY_LINE
+        return
+
+    config = BrowserConfig(use_proxy=settings.USE_PROXY)
+    executor = None
+    finished = queue.Queue()  # (kind, record) whose audio upload completed
+    pending = 0
+    counts = {kind: 0 for kind in kinds}
+    browser = None
+
+    def data_line(kind, record):
+        counts[kind] += 1
+        rid = record_id(kind, record)
+        if rid:
+            record.id = rid
+        return f'{{"type": "data", "kind": {json.dumps(kind)}, "record": {record.to_json()}}}\n'
+
+    def on_audio_done(kind, record):
+        def callback(future):
+            try:
+                record.audio = future.result()
+            except Exception as e:
+                print(f"❌ Audio copy failed: {e}")
+                record.audio = {"portal_url": None, "cloudinary_url": None}
+            finished.put((kind, record))
+        return callback
+
+    try:
+        print(f"🔒 Lock acquired for sync of {', '.join(kinds)} (Limit: {limit})")
+        # Inside the try so a failed import or bad setting still releases the lock
+        scrapers = startup.load_scrapers()
+        if include_audio:
+            executor = ThreadPoolExecutor(max_workers=settings.AUDIO_LIMIT_MAX)
+        yield json.dumps({"type": "meta", "status": "started", "kinds": kinds, "limit": limit}) + "\n"
+        browser = startup.browser_pool().acquire(config)
+
+        for kind in kinds:
+            bot = getattr(scrapers, SCRAPERS_BY_KIND[kind])(config, browser=browser)
+            bot.audio_executor = executor
+            yield json.dumps({"type": "meta", "kind": kind, "status": "section_started"}) + "\n"
+            try:
+                for record in bot.scrape_generator(limit=limit, include_audio=include_audio):
+                    if isinstance(record.audio, Future):
+                        pending += 1
+                        record.audio.add_done_callback(on_audio_done(kind, record))
+                    else:
+                        yield data_line(kind, record)
+
+                    # Flush records whose audio finished while we were scraping
+                    while not finished.empty():
+                        pending -= 1
+                        yield data_line(*finished.get())
+            except Exception as e:
+                # One broken section shouldn't cost the others
+                print(f"❌ Sync section {kind} failed: {e}")
+                yield json.dumps({"type": "error", "kind": kind, "message": str(e), "details": traceback.format_exc()}) + "\n"
+
+        # Browser work is done - hand it back before waiting on the remaining uploads
+        startup.browser_pool().release(browser)
+        browser = None
+        while pending:
+            pending -= 1
+            yield data_line(*finished.get())
+
+        yield json.dumps({"type": "meta", "status": "completed", "counts": counts}) + "\n"
+        print(f"✅ Sync finished. Sent {counts}.")
+
+    except Exception as e:
+        error_details = traceback.format_exc()
+        print(f"❌ Sync Error: {e}")
         yield json.dumps({"type": "error", "message": str(e), "details": error_details}) + "\n"
     finally:
+        if browser:
+            startup.browser_pool().release(browser)
+        if executor:
+            executor.shutdown(wait=False)
         scraper_lock.release()
         print("🔓 Lock released")
 
-@app.get("/call_history")
-def stream_call_history(limit: int = 50):
+def parse_fields(fields):
+    """Split a comma-separated ?fields= value; None/empty means all fields"""
+    if not fields:
+        return None
+    return [f.strip() for f in fields.split(",") if f.strip()] or None
+
+def bad_request(message):
+    return JSONResponse({"status": "error", "message": message}, status_code=400)
+
+def stream_response(bot_name, limit, fields=None, include_audio=True, resume=None, **scrape_options):
+    bot_class = getattr(startup.load_scrapers(), bot_name)
+    fields = parse_fields(fields)
+    try:
+        bot_class.resolve_fields(fields, include_audio)
+        if resume:
+            scrape_options["resume"] = decode_checkpoint(resume, bot_class.KIND)
+    except ValueError as e:
+        return bad_request(str(e))
+
+    # Scrape on a producer thread so a slow client doesn't hold the browser and lock
     return StreamingResponse(
-        stream_generator(CallHistory, limit),
+        buffered(
+            stream_generator(bot_class, limit, fields=fields, include_audio=include_audio, **scrape_options),
+            name=bot_class.__name__,
+        ),
         media_type="application/x-ndjson"
     )
 
-@app.get("/voicemails")
-def stream_voicemails(limit: int = 50):
+SCRAPERS_BY_KIND = {
+    "calls": "CallHistory",
+    "voicemails": "VoicemailScraper",
+    "messages": "ChatSmsScraper",
+}
+
+@app.get("/changes")
+def stream_changes(kind: str, since: Optional[str] = None, limit: int = 500, include_audio: bool = True, resume: Optional[str] = None):
+    """Records added or changed since the client's last sync token"""
+    if kind not in SCRAPERS_BY_KIND:
+        return bad_request(f"Invalid kind '{kind}', expected one of: {', '.join(SCRAPERS_BY_KIND)}")
+    change_feed = ChangeFeed(change_index, kind, change_index.parse_token(since))
+    return stream_response(SCRAPERS_BY_KIND[kind], limit, include_audio=include_audio, resume=resume, change_feed=change_feed)
+
+@app.get("/sync")
+def stream_sync(kinds: Optional[str] = None, limit: int = 50, include_audio: bool = True):
+    """Calls, voicemails and messages from one login, tagged by kind"""
+    kinds = parse_fields(kinds) or list(SCRAPERS_BY_KIND)
+    unknown = [k for k in kinds if k not in SCRAPERS_BY_KIND]
+    if unknown:
+        return bad_request(f"Invalid kinds: {', '.join(unknown)} (available: {', '.join(SCRAPERS_BY_KIND)})")
     return StreamingResponse(
-        stream_generator(VoicemailScraper, limit),
+        buffered(sync_generator(kinds, limit, include_audio), name="sync"),
         media_type="application/x-ndjson"
     )
 
+@app.get("/call_history")
+def stream_call_history(
+    limit: int = 50,
+    fields: Optional[str] = None,
+    include_audio: bool = True,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    number: Optional[str] = None,
+    direction: Optional[str] = None,
+    resume: Optional[str] = None,
+):
+    try:
+        call_filter = CallFilter.from_query(since, until, number, direction)
+    except ValueError as e:
+        return bad_request(str(e))
+    return stream_response("CallHistory", limit, fields, include_audio, resume, call_filter=call_filter)
+
+@app.get("/voicemails")
+def stream_voicemails(limit: int = 50, fields: Optional[str] = None, include_audio: bool = True, resume: Optional[str] = None):
+    return stream_response("VoicemailScraper", limit, fields, include_audio, resume)
+
 @app.get("/messages")
-def stream_messages(limit: int = 50):
-    return StreamingResponse(
-        stream_generator(ChatSmsScraper, limit),
-        media_type="application/x-ndjson"
-    )
+def stream_messages(limit: int = 50, fields: Optional[str] = None, resume: Optional[str] = None):
+    return stream_response("ChatSmsScraper", limit, fields, resume=resume)
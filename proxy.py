@@ -0,0 +1,175 @@
+import random
+import threading
+import time
+from typing import Dict, List, Optional
+
+from config import logger, settings
+
+
+class ProxyStats:
+    """Rolling latency and error statistics for a single proxy"""
+
+    def __init__(self, ip: str):
+        self.ip = ip
+        self.requests = 0
+        self.errors = 0
+        self.consecutive_errors = 0
+        self.latency_ewma: Optional[float] = None
+        self.error_ewma = 0.0
+        self.in_use = 0
+        self.quarantine_count = 0
+        self.quarantined_until = 0.0
+        self.last_error: Optional[str] = None
+
+    def is_available(self, now: float) -> bool:
+        return now >= self.quarantined_until
+
+    def score(self) -> float:
+        """Lower is better: expected latency inflated by error rate and current load"""
+        latency = (
+            self.latency_ewma
+            if self.latency_ewma is not None
+            else settings.PROXY_DEFAULT_LATENCY
+        )
+        return (
+            latency
+            * (1 + settings.PROXY_ERROR_PENALTY * self.error_ewma)
+            * (1 + self.in_use)
+        )
+
+    def to_dict(self, now: float) -> dict:
+        return {
+            "ip": self.ip,
+            "requests": self.requests,
+            "errors": self.errors,
+            "error_rate": round(self.error_ewma, 4),
+            "latency_ms": (
+                round(self.latency_ewma * 1000, 1)
+                if self.latency_ewma is not None
+                else None
+            ),
+            "in_use": self.in_use,
+            "available": self.is_available(now),
+            "quarantined_for": max(0.0, round(self.quarantined_until - now, 1)),
+            "quarantine_count": self.quarantine_count,
+            "score": round(self.score(), 4),
+            "last_error": self.last_error,
+        }
+
+
+class ProxyManager:
+    """Assigns proxies to browser and HTTP sessions based on measured health.
+
+    Proxies are picked by lowest score (latency EWMA weighted by error rate and
+    current assignments). A proxy that fails ``PROXY_MAX_CONSECUTIVE_ERRORS``
+    times in a row is quarantined with exponential backoff.
+    """
+
+    def __init__(self, ips: List[str], user: str, password: str, port: str):
+        self._user = user
+        self._password = password
+        self._port = port
+        self._stats: Dict[str, ProxyStats] = {ip: ProxyStats(ip) for ip in ips}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls) -> "ProxyManager":
+        return cls(
+            settings.PROXY_IPS,
+            settings.PROXY_USER,
+            settings.PROXY_PASS,
+            settings.PROXY_PORT,
+        )
+
+    def url(self, ip: str) -> str:
+        """Build an authenticated proxy URL usable by Chrome and requests"""
+        return f"http://{self._user}:{self._password}@{ip}:{self._port}"
+
+    def acquire(self) -> Optional[str]:
+        """Reserve the healthiest proxy and return its IP (None if none configured)"""
+        with self._lock:
+            if not self._stats:
+                return None
+
+            now = time.time()
+            candidates = [s for s in self._stats.values() if s.is_available(now)]
+            if not candidates:
+                # Everything is quarantined - use the one that recovers soonest
+                chosen = min(self._stats.values(), key=lambda s: s.quarantined_until)
+                logger.warning(
+                    f"All proxies quarantined, falling back to {chosen.ip} "
+                    f"(recovers in {chosen.quarantined_until - now:.1f}s)"
+                )
+            else:
+                best = min(s.score() for s in candidates)
+                # Break ties randomly so cold proxies all get measured
+                chosen = random.choice(
+                    [s for s in candidates if s.score() <= best * 1.05]
+                )
+
+            chosen.in_use += 1
+            logger.info(f"Assigned proxy {chosen.ip} (score={chosen.score():.3f})")
+            return chosen.ip
+
+    def release(self, ip: Optional[str]):
+        if not ip:
+            return
+        with self._lock:
+            stats = self._stats.get(ip)
+            if stats and stats.in_use > 0:
+                stats.in_use -= 1
+
+    def report(
+        self, ip: Optional[str], latency: float, ok: bool, error: Optional[str] = None
+    ):
+        """Record the outcome of one request made through ``ip``"""
+        if not ip:
+            return
+        alpha = settings.PROXY_LATENCY_ALPHA
+        with self._lock:
+            stats = self._stats.get(ip)
+            if not stats:
+                return
+
+            stats.requests += 1
+            stats.error_ewma = (1 - alpha) * stats.error_ewma + alpha * (0 if ok else 1)
+
+            if ok:
+                stats.latency_ewma = (
+                    latency
+                    if stats.latency_ewma is None
+                    else (1 - alpha) * stats.latency_ewma + alpha * latency
+                )
+                stats.consecutive_errors = 0
+                stats.quarantine_count = 0
+                return
+
+            stats.errors += 1
+            stats.consecutive_errors += 1
+            stats.last_error = error
+            if stats.consecutive_errors >= settings.PROXY_MAX_CONSECUTIVE_ERRORS:
+                backoff = min(
+                    settings.PROXY_BACKOFF_BASE * (2**stats.quarantine_count),
+                    settings.PROXY_BACKOFF_MAX,
+                )
+                stats.quarantine_count += 1
+                stats.consecutive_errors = 0
+                stats.quarantined_until = time.time() + backoff
+                logger.warning(
+                    f"Proxy {ip} quarantined for {backoff:.0f}s after repeated errors: {error}"
+                )
+
+    def is_available(self, ip: Optional[str]) -> bool:
+        if not ip:
+            return True
+        with self._lock:
+            stats = self._stats.get(ip)
+            return stats.is_available(time.time()) if stats else True
+
+    def stats(self) -> List[dict]:
+        now = time.time()
+        with self._lock:
+            return [s.to_dict(now) for s in self._stats.values()]
+
+
+proxy_manager = ProxyManager.from_settings()
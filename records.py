@@ -0,0 +1,207 @@
+import json
+from concurrent.futures import Future
+
+from config import settings
+
+# Marks a field that wasn't requested (projected away), as opposed to an empty cell (None)
+UNSET = object()
+
+# Same escaping json.dumps uses by default (ensure_ascii), without the encoder setup per call
+_encode_str = json.encoder.encode_basestring_ascii
+
+
+def _json_value(value) -> str:
+    if value is None:
+        return "null"
+    if type(value) is str:
+        return _encode_str(value)
+    return json.dumps(value)
+
+
+def _json_audio(audio) -> str:
+    if type(audio) is dict and len(audio) == 2 and "portal_url" in audio and "cloudinary_url" in audio:
+        return f'{{"portal_url": {_json_value(audio["portal_url"])}, "cloudinary_url": {_json_value(audio["cloudinary_url"])}}}'
+    return json.dumps(audio)
+
+
+class Record:
+    """Base for the slot-based records the scrapers yield.
+
+    Fields are plain attributes; anything left UNSET is omitted from the
+    output. ``to_dict()`` builds the API shape and ``to_json()`` writes the
+    same JSON straight from the slots; neither validates unless
+    ``STRICT_RECORDS`` is on.
+    """
+
+    __slots__ = ("id", "audio")
+    KIND = None
+    TEXT_FIELDS = ()
+    # Dotted API paths (as used by fingerprint.KEY_FIELDS) that don't map to a slot of the same name
+    PATHS = {}
+
+    def value(self, path: str, default=None):
+        """Value of an API field path like ``"from.number"``; ``default`` if unset"""
+        value = getattr(self, self.PATHS.get(path, path), UNSET)
+        return default if value is UNSET else value
+
+    def is_blank(self) -> bool:
+        """True if every requested text field is empty"""
+        return not any(getattr(self, f) not in (UNSET, None, "") for f in self.TEXT_FIELDS)
+
+    def validate(self):
+        """Strict mode: raise ValueError unless every set field has the serialized type"""
+        for field in self.TEXT_FIELDS:
+            value = getattr(self, field)
+            if value is not UNSET and value is not None and not isinstance(value, str):
+                raise ValueError(f"{self.KIND} record field '{field}' must be a string, got {type(value).__name__}")
+        if self.audio is not UNSET:
+            if isinstance(self.audio, Future):
+                raise ValueError(f"{self.KIND} record serialized before its audio copy finished")
+            if not isinstance(self.audio, dict) or set(self.audio) != {"portal_url", "cloudinary_url"}:
+                raise ValueError(f"{self.KIND} record has malformed audio: {self.audio!r}")
+
+    def _fields(self) -> dict:
+        raise NotImplementedError
+
+    def _json_fields(self) -> list:
+        raise NotImplementedError
+
+    def to_dict(self) -> dict:
+        if settings.STRICT_RECORDS:
+            self.validate()
+        data = self._fields()
+        if self.audio is not UNSET:
+            data["audio"] = self.audio
+        if self.id is not UNSET:
+            data["id"] = self.id
+        return data
+
+    def to_json(self) -> str:
+        """Same output as ``json.dumps(self.to_dict())``, without building the dicts"""
+        if settings.STRICT_RECORDS:
+            self.validate()
+        parts = self._json_fields()
+        if self.audio is not UNSET:
+            parts.append(f'"audio": {_json_audio(self.audio)}')
+        if self.id is not UNSET:
+            parts.append(f'"id": {_json_value(self.id)}')
+        return "{" + ", ".join(parts) + "}"
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+class CallRecord(Record):
+    __slots__ = (
+        "from_name", "from_number", "to", "dialed_number", "date", "duration",
+        "release_reason", "qos_inbound", "qos_outbound",
+    )
+    KIND = "calls"
+    TEXT_FIELDS = __slots__
+    PATHS = {"from.number": "from_number", "from.name": "from_name"}
+
+    def __init__(self):
+        self.id = self.audio = UNSET
+        self.from_name = self.from_number = self.to = self.dialed_number = UNSET
+        self.date = self.duration = self.release_reason = UNSET
+        self.qos_inbound = self.qos_outbound = UNSET
+
+    def _fields(self) -> dict:
+        data = {}
+        if self.from_number is not UNSET:
+            data["from"] = {"name": self.from_name, "number": self.from_number}
+        if self.to is not UNSET:
+            data["to"] = self.to
+        if self.dialed_number is not UNSET:
+            data["dialed_number"] = self.dialed_number
+        if self.date is not UNSET:
+            data["date"] = self.date
+        if self.duration is not UNSET:
+            data["duration"] = self.duration
+        if self.release_reason is not UNSET:
+            data["release_reason"] = self.release_reason
+        if self.qos_inbound is not UNSET:
+            data["qos"] = {"inbound": self.qos_inbound, "outbound": self.qos_outbound}
+        return data
+
+    def _json_fields(self) -> list:
+        parts = []
+        if self.from_number is not UNSET:
+            parts.append(f'"from": {{"name": {_json_value(self.from_name)}, "number": {_json_value(self.from_number)}}}')
+        if self.to is not UNSET:
+            parts.append(f'"to": {_json_value(self.to)}')
+        if self.dialed_number is not UNSET:
+            parts.append(f'"dialed_number": {_json_value(self.dialed_number)}')
+        if self.date is not UNSET:
+            parts.append(f'"date": {_json_value(self.date)}')
+        if self.duration is not UNSET:
+            parts.append(f'"duration": {_json_value(self.duration)}')
+        if self.release_reason is not UNSET:
+            parts.append(f'"release_reason": {_json_value(self.release_reason)}')
+        if self.qos_inbound is not UNSET:
+            parts.append(f'"qos": {{"inbound": {_json_value(self.qos_inbound)}, "outbound": {_json_value(self.qos_outbound)}}}')
+        return parts
+
+
+class VoicemailRecord(Record):
+    __slots__ = ("name", "number", "date", "duration")
+    KIND = "voicemails"
+    TEXT_FIELDS = __slots__
+
+    def __init__(self):
+        self.id = self.audio = UNSET
+        self.name = self.number = self.date = self.duration = UNSET
+
+    def _fields(self) -> dict:
+        data = {}
+        if self.name is not UNSET:
+            data["name"] = self.name
+        if self.number is not UNSET:
+            data["number"] = self.number
+        if self.date is not UNSET:
+            data["date"] = self.date
+        if self.duration is not UNSET:
+            data["duration"] = self.duration
+        return data
+
+    def _json_fields(self) -> list:
+        parts = []
+        if self.name is not UNSET:
+            parts.append(f'"name": {_json_value(self.name)}')
+        if self.number is not UNSET:
+            parts.append(f'"number": {_json_value(self.number)}')
+        if self.date is not UNSET:
+            parts.append(f'"date": {_json_value(self.date)}')
+        if self.duration is not UNSET:
+            parts.append(f'"duration": {_json_value(self.duration)}')
+        return parts
+
+
+class MessageRecord(Record):
+    __slots__ = ("number", "message", "time")
+    KIND = "messages"
+    TEXT_FIELDS = __slots__
+
+    def __init__(self):
+        self.id = self.audio = UNSET
+        self.number = self.message = self.time = UNSET
+
+    def _fields(self) -> dict:
+        data = {}
+        if self.number is not UNSET:
+            data["number"] = self.number
+        if self.message is not UNSET:
+            data["message"] = self.message
+        if self.time is not UNSET:
+            data["time"] = self.time
+        return data
+
+    def _json_fields(self) -> list:
+        parts = []
+        if self.number is not UNSET:
+            parts.append(f'"number": {_json_value(self.number)}')
+        if self.message is not UNSET:
+            parts.append(f'"message": {_json_value(self.message)}')
+        if self.time is not UNSET:
+            parts.append(f'"time": {_json_value(self.time)}')
+        return parts
@@ -1,11 +1,19 @@
 from enum import Enum
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel
 
 
-class Element(BaseModel):
-    id: str = Field(...)
-    selector: str = Field(...)
+class Element:
+    """Handle to an element held in the browser's ElementCache (one per DOM lookup)"""
+
+    __slots__ = ("id", "selector")
+
+    def __init__(self, id: str, selector: str):
+        self.id = id
+        self.selector = selector
+
+    def __repr__(self):
+        return f"Element(id={self.id!r}, selector={self.selector!r})"
 
 class ErrorType(str, Enum):
     """Enum for categorizing types of errors."""
@@ -2,163 +2,337 @@ import time
 import json
 from datetime import datetime
 from base import BotasaurusBrowser, logger
-from botasaurus.browser import Driver, Wait
-from selenium.webdriver.common.by import By
 from config import settings
-from utils import download_with_browser_session, upload_to_cloudinary
-
-class CallHistory(BotasaurusBrowser):
+from filters import UnparsedDateError
+from fingerprint import record_id
+from records import CallRecord, MessageRecord, VoicemailRecord
+from utils import download_with_cookies, upload_to_cloudinary
+
+class MongotelScraper(BotasaurusBrowser):
+    KIND = None
+    FIELDS = ()
     USERNAME = settings.MONGOTEL_USERNAME
     PASSWORD = settings.MONGOTEL_PASSWORD
     BASE_URL = "https://portal.mongotel.com/portal/login/"
 
-    def scrape_generator(self, limit=50):
-        try:
-            if not self.USERNAME or not self.PASSWORD:
-                raise ValueError("Missing credentials")
+    # Optional executor that overlaps audio copies with navigation (see process_audio)
+    audio_executor = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Next row to process (1-based page, 0-based row), read by the stream for checkpoints
+        self.position = {"page": 1, "row": 0}
+
+    def seed_position(self, resume):
+        """Start from the checkpoint, so a failure before the first row hands the same token back"""
+        if resume:
+            self.position = {"page": resume["page"], "row": resume["row"]}
+
+    def open_page(self, url, **kwargs):
+        """goto_page that fails the scrape instead of reading a throttled, broken or redirected page"""
+        if not self.goto_page(url, **kwargs):
+            raise RuntimeError(f"Could not load {url}")
+
+    def login(self):
+        """Log in unless this pooled browser still holds a portal session"""
+        if not self.USERNAME or not self.PASSWORD:
+            raise ValueError("Missing credentials")
+
+        self.open_page(self.BASE_URL, page_to_be=False)
 
-            self.goto_page(self.BASE_URL)
-            self.fill_input(selector="#LoginUsername", text=self.USERNAME, timeout=10)
+        # A live session redirects away from the login page
+        if self.browser.logged_in and "/login" not in (self.driver.current_url or ""):
+            logger.info("Reusing logged-in browser session")
+            return
+
+        if self.element_exists("#LoginUsername", timeout=10):
+            logger.info("Logging in...")
+            self.fill_input(selector="#LoginUsername", text=self.USERNAME)
             self.fill_input(selector="#LoginPassword", text=self.PASSWORD)
             self.click('input[type="submit"][value="Log In"]')
+            self.element_exists("#navbar-mobile", timeout=10)
+        self.browser.logged_in = True
+
+    @classmethod
+    def resolve_fields(cls, fields=None, include_audio=True) -> set:
+        """Validate a field projection; None means every field"""
+        wanted = set(fields) if fields else set(cls.FIELDS)
+        unknown = wanted - set(cls.FIELDS)
+        if unknown:
+            raise ValueError(
+                f"Unknown fields for {cls.__name__}: {', '.join(sorted(unknown))} "
+                f"(available: {', '.join(cls.FIELDS)})"
+            )
+        if not include_audio:
+            wanted.discard("audio")
+        return wanted
+
+    def process_audio(self, audio_url):
+        """Copy a portal recording to Cloudinary; failures leave cloudinary_url empty.
+
+        With an ``audio_executor`` set, the copy runs in the background and a
+        Future resolving to the same dict is returned instead.
+        """
+        if self.audio_executor and audio_url:
+            # Cookies are read here, on the browser's thread; the copy doesn't touch the driver
+            cookies = self.driver.get_cookies()
+            return self.audio_executor.submit(self.copy_audio, audio_url, cookies, self.proxy_ip)
+        cookies = self.driver.get_cookies() if audio_url else None
+        return self.copy_audio(audio_url, cookies, self.proxy_ip)
+
+    @staticmethod
+    def copy_audio(audio_url, cookies, proxy_ip=None):
+        audio_cloud_url = None
+        if audio_url:
+            try:
+                audio_bytes = download_with_cookies(cookies, url=audio_url, proxy_ip=proxy_ip)
+                audio_cloud_url = upload_to_cloudinary(audio_bytes)
+            except Exception as e:
+                logger.error(f"Audio upload failed for {audio_url}: {e}")
+        return {
+            "portal_url": audio_url,
+            "cloudinary_url": audio_cloud_url
+        }
+
+    def key_record(self, row) -> dict:
+        """Just the identity fields of a row, enough to compute its fingerprint"""
+        raise NotImplementedError
+
+    def resume_index(self, rows, resume) -> int:
+        """Index of the first row to process when resuming on this page.
+
+        Prefers the row after the checkpoint's last record, which survives new
+        rows being inserted at the top; falls back to the stored row offset.
+        """
+        offset = min(resume.get("row", 0), len(rows))
+        last_id = resume.get("last_id")
+        if not last_id:
+            return offset
+
+        # The anchor is most likely right before the offset; otherwise rows have shifted
+        candidates = [offset - 1] + [i for i in range(len(rows)) if i != offset - 1]
+        for index in candidates:
+            if index < 0:
+                continue
+            try:
+                if record_id(self.KIND, self.key_record(rows[index])) == last_id:
+                    logger.info(f"Resuming after checkpoint record at row {index}")
+                    return index + 1
+            except Exception as e:
+                logger.debug(f"Could not fingerprint row {index} while resuming: {e}")
+
+        logger.warning(f"Checkpoint record not found on page, resuming at row offset {offset}")
+        return offset
+
+
+class CallHistory(MongotelScraper):
+    KIND = "calls"
+    FIELDS = ("from", "to", "dialed_number", "date", "duration", "release_reason", "qos", "audio")
+    TABLE_ROWS = "#call-history-table tbody tr"
+
+    # Text cells, with fallback selectors tried in order
+    CELLS = {
+        "from_name": (".from_name-field",),
+        "from_number": (".from-field a", ".from-field"),
+        "to": (".to-field",),
+        "dialed_number": (".dialed-field a", ".dialed-field"),
+        "date": (".date-field",),
+        "duration": (".duration-field",),
+        "release_reason": (".release_reason-field",),
+    }
+
+    def scrape_generator(self, limit=50, fields=None, include_audio=True, call_filter=None, record_filter=None, resume=None):
+        try:
+            wanted = self.resolve_fields(fields, include_audio)
+            self.seed_position(resume)
+            self.login()
 
             self.element_exists("#LinkCallhistoryIndex", timeout=15)
             self.click("#LinkCallhistoryIndex")
 
-            # Set table columns
-            self.click("#table-column-selector-title", timeout=10)
-            self.click('input[data-table="callhistory"][value="qos"]')
-            self.click('input[data-table="callhistory"][value="release_reason"]')
-            self.click('#call-history-table')
+            # Set table columns - only the optional ones that were actually requested
+            optional_columns = [c for c in ("qos", "release_reason") if c in wanted]
+            if optional_columns:
+                self.click("#table-column-selector-title", timeout=10)
+                # Pooled browsers may already have these columns on - don't toggle them off
+                for column in optional_columns:
+                    self.set_checkbox(f'input[data-table="callhistory"][value="{column}"]')
+                self.click('#call-history-table')
 
             # Wait for initial data load
             logger.info("Waiting for table data to load...")
-            self.element_exists("#call-history-table tbody tr", timeout=20)
-            
+            self.element_exists(self.TABLE_ROWS, timeout=20)
+
+            page = 1
+            if resume:
+                # Page through without reading rows to get back to the checkpoint
+                while page < resume["page"]:
+                    if not self.next_page():
+                        logger.warning(f"Could not reach checkpoint page {resume['page']}, stopped at {page}")
+                        return
+                    page += 1
+                logger.info(f"Resuming call history at page {page}")
+
             count = 0
 
             while True:
-                rows = self.find_element("#call-history-table tbody tr", multiple=True) or []
-                
+                rows = self.find_element(self.TABLE_ROWS, multiple=True) or []
+
                 # Retry once if rows are empty despite wait
                 if not rows:
                     logger.info("No rows found, waiting a bit more...")
-                    self.sleep(5)
-                    rows = self.find_element("#call-history-table tbody tr", multiple=True) or []
+                    time.sleep(5)
+                    rows = self.find_element(self.TABLE_ROWS, multiple=True) or []
 
                 logger.info(f"Processing {len(rows)} rows...")
 
-                for row in rows:
+                start = 0
+                if resume and page == resume["page"]:
+                    start = self.resume_index(rows, resume)
+
+                for index in range(start, len(rows)):
                     if count >= limit:
                         logger.info(f"Limit of {limit} reached.")
                         return
 
+                    self.position = {"page": page, "row": index + 1}
                     try:
-                        # Helper to find text within the current row
-                        def get_text_from_row(selector):
-                            el = self.find_element(selector, element_id=row.id)
-                            return self.text_content(element_id=el.id).strip() if el else None
-
-                        # Extract data relative to the ROW context
-                        from_name = get_text_from_row(".from_name-field")
-                        from_number = get_text_from_row(".from-field a")
-                        if not from_number:
-                            from_number = get_text_from_row(".from-field")
-
-                        to_field = get_text_from_row(".to-field")
-                        dialed_number = get_text_from_row(".dialed-field a") or get_text_from_row(".dialed-field")
-                        date_val = get_text_from_row(".date-field")
-                        duration = get_text_from_row(".duration-field")
-                        release_reason = get_text_from_row(".release_reason-field")
-
-                        # QoS Links
-                        qos_links = self.find_element("a.view-qos", element_id=row.id, multiple=True) or []
-                        qos_in = self.text_content(element_id=qos_links[0].id).strip() if len(qos_links) > 0 else None
-                        qos_out = self.text_content(element_id=qos_links[1].id).strip() if len(qos_links) > 1 else None
-
-                        # Audio
-                        audio_url = None
-                        audio_cloud_url = None
-                        
-                        audio_el = self.find_element("a.download-audio", element_id=row.id)
-                        if audio_el:
-                             cls = self.get_attribute("class", element_id=audio_el.id)
-                             if cls and "disabled" not in cls:
-                                 audio_url = self.get_attribute("href", element_id=audio_el.id)
-
-                        if audio_url:
-                            try:
-                                audio_bytes = download_with_browser_session(self.driver, url=audio_url)
-                                audio_cloud_url = upload_to_cloudinary(audio_bytes)
-                            except Exception as e:
-                                logger.error(f"Audio upload failed for row: {e}")
-
-                        record = {
-                            "from": {
-                                "name": from_name,
-                                "number": from_number,
-                            },
-                            "to": to_field,
-                            "dialed_number": dialed_number,
-                            "date": date_val,
-                            "duration": duration,
-                            "release_reason": release_reason,
-                            "qos": {
-                                "inbound": qos_in,
-                                "outbound": qos_out,
-                            },
-                            "audio": {
-                                "portal_url": audio_url,
-                                "cloudinary_url": audio_cloud_url
-                            }
-                        }
-                        
-                        yield record
-                        count += 1
-
+                        verdict, record = self.extract_row(rows[index], wanted, call_filter, record_filter)
+                    except UnparsedDateError:
+                        raise
                     except Exception as e:
                         logger.error(f"Row skipped due to error: {e}")
-                
-                #  Check if "Next" is disabled
-                next_button = self.find_element("li.next", multiple=False)
-                if not next_button:
-                    break
-                cls = self.get_attribute("class", element_id=next_button.id)
-                if "disabled" in cls:
-                    break
-                else:
-                    # Click Next
-                    link = next_button.find_element_by_tag_name("a")
-                    if link:
-                        self.click(link)
-                        self.wait_for_page(link)
-                    else:
-                        break
-        finally:
-            if hasattr(self, 'driver'):
-                self.driver.close()
+                        continue
 
+                    if verdict == "stop":
+                        logger.info("Reached calls older than the requested range, stopping.")
+                        return
+                    if verdict == "skip":
+                        continue
 
-class VoicemailScraper(BotasaurusBrowser):
-    USERNAME = settings.MONGOTEL_USERNAME
-    PASSWORD = settings.MONGOTEL_PASSWORD
-    BASE_URL = "https://portal.mongotel.com/portal/login/"
+                    yield record
+                    count += 1
+
+                if not self.next_page():
+                    break
+                page += 1
+                self.position = {"page": page, "row": 0}
+        finally:
+            self.release()
+
+    def key_record(self, row) -> dict:
+        return {
+            "date": self.read_cell(row, "date"),
+            "from": {"number": self.read_cell(row, "from_number")},
+            "dialed_number": self.read_cell(row, "dialed_number"),
+            "duration": self.read_cell(row, "duration"),
+        }
+
+    def read_cell(self, row, name):
+        value = None
+        for selector in self.CELLS[name]:
+            el = self.find_element(selector, element_id=row.id)
+            value = self.text_content(element_id=el.id).strip() if el else None
+            if value:
+                break
+        return value
+
+    def extract_row(self, row, wanted, call_filter=None, record_filter=None):
+        """Return (verdict, record); filter cells are read first so discarded rows cost nothing more"""
+        cells = {}
+
+        def cell(name):
+            if name not in cells:
+                cells[name] = self.read_cell(row, name)
+            return cells[name]
+
+        if call_filter:
+            verdict = call_filter.check(
+                cell("date") if call_filter.needs_date else None,
+                cell("from_number") if call_filter.needs_numbers else None,
+                (cell("to"), cell("dialed_number")) if call_filter.number else (),
+            )
+            if verdict != "match":
+                return verdict, None
+
+        # Extract only the requested data relative to the ROW context
+        record = CallRecord()
+        if "from" in wanted:
+            record.from_name = cell("from_name")
+            record.from_number = cell("from_number")
+        for field in ("to", "dialed_number", "date", "duration", "release_reason"):
+            if field in wanted:
+                setattr(record, field, cell(field))
+
+        if "qos" in wanted:
+            qos_links = self.find_element("a.view-qos", element_id=row.id, multiple=True) or []
+            record.qos_inbound = self.text_content(element_id=qos_links[0].id).strip() if len(qos_links) > 0 else None
+            record.qos_outbound = self.text_content(element_id=qos_links[1].id).strip() if len(qos_links) > 1 else None
+
+        # Decide on the record before paying for its audio
+        if record_filter and not record_filter(record):
+            return "skip", None
+
+        if "audio" in wanted:
+            audio_url = None
+            audio_el = self.find_element("a.download-audio", element_id=row.id)
+            if audio_el:
+                cls = self.get_attribute("class", element_id=audio_el.id)
+                if cls and "disabled" not in cls:
+                    audio_url = self.get_attribute("href", element_id=audio_el.id)
+            record.audio = self.process_audio(audio_url)
+
+        return "match", record
+
+    def first_row_html(self):
+        return self.driver.run_js(
+            f"const row = document.querySelector({json.dumps(self.TABLE_ROWS)}); return row ? row.outerHTML : null;"
+        )
+
+    def wait_for_table_change(self, previous_html, timeout=15) -> bool:
+        """Poll until the table's first row differs from ``previous_html``"""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            current = self.first_row_html()
+            if current and current != previous_html:
+                return True
+            time.sleep(0.25)
+        logger.warning(f"Call history table did not refresh within {timeout}s")
+        return False
+
+    def next_page(self) -> bool:
+        #  Check if "Next" is disabled
+        next_button = self.find_element("li.next", multiple=False)
+        if not next_button:
+            return False
+        cls = self.get_attribute("class", element_id=next_button.id) or ""
+        if "disabled" in cls:
+            return False
+
+        first_row = self.first_row_html()
+        if not self.click("li.next a"):
+            return False
+        return self.wait_for_table_change(first_row)
+
+
+class VoicemailScraper(MongotelScraper):
+    KIND = "voicemails"
+    FIELDS = ("name", "number", "date", "duration", "audio")
+    COLUMNS = {"name": 2, "number": 1, "date": 3, "duration": 4}
     VOICEMAILS_URL = "https://portal.mongotel.com/portal/voicemails"
 
-    def scrape_generator(self, limit=50):
+    def key_record(self, row) -> dict:
+        cols = self.find_element("td", element_id=row.id, multiple=True) or []
+        return {f: self.text_content(element_id=cols[self.COLUMNS[f]].id).strip() for f in ("date", "number", "duration")}
+
+    def scrape_generator(self, limit=50, fields=None, include_audio=True, record_filter=None, resume=None):
         try:
-            self.driver.get(self.BASE_URL)
-            
-            # Check if login is needed
-            if self.element_exists("#LoginUsername", timeout=5):
-                logger.info("Logging in...")
-                self.fill_input(selector="#LoginUsername", text=self.USERNAME)
-                self.fill_input(selector="#LoginPassword", text=self.PASSWORD)
-                self.click('input[type="submit"][value="Log In"]')
-                self.element_exists("#navbar-mobile", timeout=10)
-            
+            wanted = self.resolve_fields(fields, include_audio)
+            self.seed_position(resume)
+            self.login()
+
             logger.info("Navigating to Voicemails...")
-            self.goto_page(self.VOICEMAILS_URL)
+            self.open_page(self.VOICEMAILS_URL)
             
             # Wait for table
             self.element_exists("table tbody tr", timeout=15)
@@ -166,75 +340,63 @@ class VoicemailScraper(BotasaurusBrowser):
             rows = self.find_element("table tbody tr", multiple=True) or []
             logger.info(f"Found {len(rows)} potential rows, extracting data...")
             
+            start = self.resume_index(rows, resume) if resume else 0
             count = 0
-            for row in rows:
+            for row_index in range(start, len(rows)):
                 if count >= limit:
                     logger.info(f"Limit of {limit} reached.")
                     return
 
+                self.position = {"page": 1, "row": row_index + 1}
                 try:
-                    cols = self.find_element("td", element_id=row.id, multiple=True)
+                    cols = self.find_element("td", element_id=rows[row_index].id, multiple=True)
                     if not cols or len(cols) != 6:
                         continue
 
-                    number = self.text_content(element_id=cols[1].id).strip()
-                    name = self.text_content(element_id=cols[2].id).strip()
-                    date_val = self.text_content(element_id=cols[3].id).strip()
-                    duration = self.text_content(element_id=cols[4].id).strip()
-
-                    audio_url = None
-                    audio_cloud_url = None
-                    audio_el = self.find_element(".download-audio", element_id=cols[5].id)
-                    if audio_el:
-                        audio_url = self.get_attribute("href", element_id=audio_el.id)
-
-                    if audio_url:
-                        try:
-                            audio_bytes = download_with_browser_session(self.driver, url=audio_url)
-                            audio_cloud_url = upload_to_cloudinary(audio_bytes)
-                        except Exception as e:
-                            logger.error(f"Audio upload failed for voicemail from {number}: {e}")
-
-                    yield {
-                        "name": name,
-                        "number": number,
-                        "date": date_val,
-                        "duration": duration,
-                        "audio": {
-                            "portal_url": audio_url,
-                            "cloudinary_url": audio_cloud_url
-                        }
-                    }
+                    record = VoicemailRecord()
+                    for field, index in self.COLUMNS.items():
+                        if field in wanted:
+                            setattr(record, field, self.text_content(element_id=cols[index].id).strip())
+
+                    # Decide on the record before paying for its audio
+                    if record_filter and not record_filter(record):
+                        continue
+
+                    if "audio" in wanted:
+                        audio_url = None
+                        audio_el = self.find_element(".download-audio", element_id=cols[5].id)
+                        if audio_el:
+                            audio_url = self.get_attribute("href", element_id=audio_el.id)
+                        record.audio = self.process_audio(audio_url)
+
+                    yield record
                     count += 1
 
                 except Exception as e:
                     logger.error(f"Voicemail row skipped due to error: {e}")
 
         finally:
-            if hasattr(self, 'driver'):
-                self.driver.close()
+            self.release()
 
 
-class ChatSmsScraper(BotasaurusBrowser):
-    USERNAME = settings.MONGOTEL_USERNAME
-    PASSWORD = settings.MONGOTEL_PASSWORD
-    BASE_URL = "https://portal.mongotel.com/portal/login/"
+class ChatSmsScraper(MongotelScraper):
+    KIND = "messages"
+    FIELDS = ("number", "message", "time")
+    COLUMNS = {"number": 1, "message": 3, "time": 4}
     MESSAGES_URL = "https://portal.mongotel.com/portal/messages"
 
-    def scrape_generator(self, limit=50):
+    def key_record(self, row) -> dict:
+        cols = self.find_element("td", element_id=row.id, multiple=True) or []
+        return {f: self.text_content(element_id=cols[self.COLUMNS[f]].id).strip() for f in ("number", "time")}
+
+    def scrape_generator(self, limit=50, fields=None, include_audio=True, record_filter=None, resume=None):
         try:
-            self.driver.get(self.BASE_URL)
-            
-            # Check if login is needed
-            if self.element_exists("#LoginUsername", timeout=5):
-                logger.info("Logging in...")
-                self.fill_input(selector="#LoginUsername", text=self.USERNAME)
-                self.fill_input(selector="#LoginPassword", text=self.PASSWORD)
-                self.click('input[type="submit"][value="Log In"]')
-                self.element_exists("#navbar-mobile", timeout=10)
-            
+            wanted = self.resolve_fields(fields, include_audio)
+            self.seed_position(resume)
+            self.login()
+
             logger.info("Navigating to Messages...")
-            self.goto_page(self.MESSAGES_URL)
+            self.open_page(self.MESSAGES_URL)
             
             # Wait for table
             self.element_exists("table tbody tr", timeout=15)
@@ -242,35 +404,34 @@ class ChatSmsScraper(BotasaurusBrowser):
             rows = self.find_element("table tbody tr", multiple=True) or []
             logger.info(f"Found {len(rows)} potential rows, extracting data...")
 
+            start = self.resume_index(rows, resume) if resume else 0
             count = 0
-            for row in rows:
+            for row_index in range(start, len(rows)):
                 if count >= limit:
                     logger.info(f"Limit of {limit} reached.")
                     return
 
+                self.position = {"page": 1, "row": row_index + 1}
                 try:
-                    cols = self.find_element("td", element_id=row.id, multiple=True)
+                    cols = self.find_element("td", element_id=rows[row_index].id, multiple=True)
                     if not cols or len(cols) < 5:
                         continue
 
-                    number = self.text_content(element_id=cols[1].id).strip()
-                    message = self.text_content(element_id=cols[3].id).strip()
-                    time_val = self.text_content(element_id=cols[4].id).strip()
-                    
-                    if number or message:
-                        yield {
-                            "number": number,
-                            "message": message,
-                            "time": time_val
-                        }
+                    record = MessageRecord()
+                    for field, index in self.COLUMNS.items():
+                        if field in wanted:
+                            setattr(record, field, self.text_content(element_id=cols[index].id).strip())
+
+                    # Skip blank rows (nothing in the requested cells)
+                    if not record.is_blank() and (not record_filter or record_filter(record)):
+                        yield record
                         count += 1
 
                 except Exception as e:
                     logger.error(f"Message row skipped due to error: {e}")
 
         finally:
-            if hasattr(self, 'driver'):
-                self.driver.close()
+            self.release()
 
 
 if __name__ == "__main__":
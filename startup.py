@@ -0,0 +1,114 @@
+import importlib
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from config import logger, settings
+from metrics import metrics
+from schemas import BrowserConfig
+
+# Process start reference for the "boot" phase (interpreter start -> app imported)
+try:
+    import psutil
+
+    PROCESS_STARTED_AT = psutil.Process().create_time()
+except Exception:
+    PROCESS_STARTED_AT = time.time()
+
+
+class StartupState:
+    """Tracks cold-start phases and whether the scraper is warm.
+
+    "Up" means the API process answers; "ready" means the heavy scraper
+    modules are imported and, with PREWARM_BROWSER, a logged-in browser is
+    waiting in the pool (or pre-warming failed and ``error`` says why).
+    """
+
+    def __init__(self):
+        self.phases = {}
+        self.loaded = threading.Event()  # scraper module fully imported
+        self.ready = threading.Event()
+        self.error = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @contextmanager
+    def phase(self, name: str):
+        start_time = time.time()
+        try:
+            yield
+        finally:
+            self.record(name, time.time() - start_time)
+
+    def record(self, name: str, seconds: float):
+        self.phases[name] = round(seconds, 3)
+        metrics.set("startup_phase_seconds", round(seconds, 3), phase=name)
+        logger.info(f"Startup phase '{name}' took {seconds:.3f}s")
+
+    def to_dict(self) -> dict:
+        return {
+            "ready": self.ready.is_set(),
+            "error": self.error,
+            "phases": dict(self.phases),
+            "uptime": round(time.time() - PROCESS_STARTED_AT, 3),
+        }
+
+
+state = StartupState()
+
+
+def load_scrapers():
+    """Import the scraper stack (botasaurus, psutil, ...) once, timing it"""
+    # Not sys.modules: a module is registered there before its body has run
+    if state.loaded.is_set():
+        return sys.modules["scraper"]
+    with state._lock:
+        if not state.loaded.is_set():
+            with state.phase("import_scraper"):
+                importlib.import_module("scraper")
+            browser_pool().start_watchdog()
+            state.loaded.set()
+            # With PREWARM_BROWSER, warm_up() decides - unless it has already failed
+            if not settings.PREWARM_BROWSER or state.error:
+                state.ready.set()
+    return sys.modules["scraper"]
+
+
+def browser_pool():
+    """The browser pool, or None while the heavy modules are still loading"""
+    base = sys.modules.get("base")
+    # base may still be mid-import on the preload thread
+    return getattr(base, "browser_pool", None) if base else None
+
+
+def warm_up():
+    try:
+        scraper = load_scrapers()
+
+        if settings.PREWARM_BROWSER:
+            with state.phase("launch_browser"):
+                bot = scraper.CallHistory(BrowserConfig(use_proxy=settings.USE_PROXY))
+            try:
+                with state.phase("login"):
+                    bot.login()
+            finally:
+                bot.release()
+
+            state.ready.set()
+        state.record("ready", time.time() - PROCESS_STARTED_AT)
+    except Exception as e:
+        state.error = f"{type(e).__name__}: {e}"
+        logger.error(f"Warm-up failed: {state.error}", exc_info=True)
+        # A failed pre-warm only means the first job launches its own browser
+        if state.loaded.is_set():
+            state.ready.set()
+
+
+def start():
+    """Kick off background warm-up so /healthz answers immediately"""
+    state.record("boot", time.time() - PROCESS_STARTED_AT)
+    if not settings.PRELOAD_ON_STARTUP and not settings.PREWARM_BROWSER:
+        return
+    state._thread = threading.Thread(target=warm_up, daemon=True)
+    state._thread.start()
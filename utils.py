@@ -1,22 +1,44 @@
-import requests
-import cloudinary
-import cloudinary.uploader
+import time
 from uuid import uuid4
+from limiter import audio_limiter
+from proxy import proxy_manager
+
+# requests and cloudinary are imported on first use to keep cold start fast
+
+def download_with_cookies(cookies, url, proxy_ip=None):
+    """Download with a snapshot of browser cookies - safe to call off the browser thread"""
+    import requests
 
-def download_with_browser_session(driver, url):
     session = requests.Session()
 
     # copy cookies from browser
-    for c in driver.get_cookies():
+    for c in cookies:
         session.cookies.set(c["name"], c["value"])
 
-    r = session.get(url, timeout=60)
-    r.raise_for_status()
+    # leave from the same IP as the browser so the portal session stays valid
+    if proxy_ip:
+        proxy_url = proxy_manager.url(proxy_ip)
+        session.proxies = {"http": proxy_url, "https": proxy_url}
+
+    start_time = time.time()
+    try:
+        with audio_limiter.track():
+            r = session.get(url, timeout=60)
+            r.raise_for_status()
+    except requests.RequestException as e:
+        # plain 4xx answers mean the proxy did its job; throttling and 5xx count against it
+        status = e.response.status_code if e.response is not None else None
+        proxy_ok = status is not None and status < 500 and status not in (407, 429)
+        proxy_manager.report(proxy_ip, time.time() - start_time, ok=proxy_ok, error=f"{type(e).__name__}: {e}")
+        raise
+    proxy_manager.report(proxy_ip, time.time() - start_time, ok=True)
     return r.content
 
 
 
 def upload_to_cloudinary(audio_bytes):
+    import cloudinary.uploader
+
     public_id = f"calls/{uuid4()}"
     result = cloudinary.uploader.upload(
         audio_bytes,